@@ -0,0 +1,216 @@
+""" Classe Level """
+import random
+from collections import deque
+from typing import Tuple, Iterable, Dict, FrozenSet, NamedTuple
+
+Position = Tuple[int, int]
+
+# direction order shared by every engine: left, right, up, down
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+# the 8 rotations and reflections of the grid, (x, y) -> (a x + b y, c x + d y) as (a, b, c, d), identity first
+TRANSFORMS = (
+    (1, 0, 0, 1), (0, -1, 1, 0), (-1, 0, 0, -1), (0, 1, -1, 0),
+    (-1, 0, 0, 1), (1, 0, 0, -1), (0, 1, 1, 0), (0, -1, -1, 0),
+)
+
+# an automorphism of a level: cells[n] is the image of cell n, directions[d] the image of direction d
+Symmetry = NamedTuple(
+    "Symmetry",
+    [
+        ("cells", Tuple[int, ...]),
+        ("directions", Tuple[int, ...]),
+    ],
+)
+
+# push distance of the cells from which a crate can never reach a goal
+UNREACHABLE = 1 << 20
+
+# seed of the Zobrist keys, fixed so that hashes are reproducible across processes
+ZOBRIST_SEED = 0x50C0BA
+
+# size (floor cells x goals) from which the tables of a level are built with NumPy, when it is installed:
+# below, importing NumPy costs more than it saves
+GRID_THRESHOLD = 1 << 15
+
+
+def numpy_grid(size: int):
+    """returns the grid module if NumPy is installed and worth importing for a level of the given size, else None"""
+    if size < GRID_THRESHOLD:
+        return None
+    from . import grid  # grid imports this module
+    return grid if grid.available else None
+
+
+class Level:
+    """
+    Static data of a Sokoban puzzle, built once per level.
+    Every floor cell (any cell of the map which is not a wall) gets a linear
+    index, in row-major order, so that crates can be stored as an int bitmask
+    and the hero as a small int.
+    It also owns the Zobrist keys used to hash search nodes incrementally:
+    a node hash is the xor of the keys of its crates and of its hero.
+    """
+
+    def __init__(self, walls: Iterable[Position], goals: Iterable[Position], map_size: Tuple[int, int]) -> None:
+        self.walls: FrozenSet[Position] = frozenset(walls)
+        self.goals: FrozenSet[Position] = frozenset(goals)
+        self.map_size = map_size
+        w, h = map_size
+
+        self.cells: Tuple[Position, ...] = tuple(
+            (x, y) for y in range(h) for x in range(w) if (x, y) not in self.walls
+        )
+        self.index: Dict[Position, int] = {pos: n for n, pos in enumerate(self.cells)}
+        self.hero_bits = max(1, (len(self.cells) - 1).bit_length())
+        self.goal_mask = self.mask(self.goals)
+        self.goal_cells: Tuple[int, ...] = tuple(sorted(self.index[goal] for goal in self.goals))
+        grid = numpy_grid(len(self.cells) * len(self.goal_cells))
+
+        # neighbours[cell][direction] is the index of the adjacent floor cell, or -1
+        self.neighbours: Tuple[Tuple[int, int, int, int], ...]
+        # squares[cell] lists the 3 other cells (or -1 for a wall) of the four 2x2 squares around cell
+        self.squares: Tuple[Tuple[Tuple[int, int, int], ...], ...]
+        if grid is not None:
+            neighbours, squares = grid.cell_tables(self)
+            self.neighbours = tuple(map(tuple, neighbours.tolist()))
+            self.squares = tuple(tuple(map(tuple, square)) for square in squares.tolist())
+        else:
+            self.neighbours = tuple(
+                tuple(self.index.get((x + dx, y + dy), -1) for dx, dy in DIRECTIONS)
+                for x, y in self.cells
+            )
+            self.squares = tuple(
+                tuple(
+                    (self.index.get((x + dx, y), -1), self.index.get((x, y + dy), -1),
+                     self.index.get((x + dx, y + dy), -1))
+                    for dx, dy in ((-1, -1), (1, -1), (-1, 1), (1, 1))
+                )
+                for x, y in self.cells
+            )
+        # goal_distances[i][cell] is the number of pushes needed to bring a crate from cell
+        # to the i-th goal of goal_cells, ignoring the other crates
+        self.goal_distances: Tuple[Tuple[int, ...], ...]
+        if grid is not None:
+            # all the goals at once, as NumPy wavefronts
+            distances = grid.goal_distances(self)
+            self.goal_distances = tuple(map(tuple, distances.tolist()))
+            dead = grid.dead_cells(distances)
+        else:
+            self.goal_distances = tuple(self.pull_distances(goal) for goal in self.goal_cells)
+            dead = [
+                n for n in range(len(self.cells))
+                if all(distances[n] == UNREACHABLE for distances in self.goal_distances)
+            ]
+        # dead squares: cells from which a crate can never be pushed to any goal
+        self.dead_mask = sum(1 << n for n in dead)
+        self.dead_squares: FrozenSet[Position] = frozenset(self.positions(self.dead_mask))
+        # automorphisms among the 8 rotations and reflections, the identity first
+        self.symmetries: Tuple[Symmetry, ...] = self.find_symmetries()
+
+        rng = random.Random(ZOBRIST_SEED)
+        self.crate_keys: Dict[Position, int] = {pos: rng.getrandbits(64) for pos in self.cells}
+        self.hero_keys: Dict[Position, int] = {pos: rng.getrandbits(64) for pos in self.cells}
+
+    def zobrist(self, crates: Iterable[Position], hero: Position) -> int:
+        """computes from scratch the Zobrist hash of a node"""
+        key = self.hero_keys.get(hero, 0)
+        for crate in crates:
+            key ^= self.crate_keys[crate]
+        return key
+
+    def find_symmetries(self) -> Tuple[Symmetry, ...]:
+        """
+        returns the rotations and reflections which map the goals, and the floor cells connected
+        to a goal, onto themselves (up to a translation); the other floor cells, where no crate
+        of a solvable position can stand, are left in place
+        """
+        identity = Symmetry(tuple(range(len(self.cells))), (0, 1, 2, 3))
+        interior = self.flood(self.goal_cells)
+        if not interior:
+            return (identity,)
+        cells, index = self.cells, self.index
+        xs, ys = [cells[n][0] for n in interior], [cells[n][1] for n in interior]
+        min_x, max_x, min_y, max_y = min(xs), max(xs), min(ys), max(ys)
+        corners = ((min_x, min_y), (min_x, max_y), (max_x, min_y), (max_x, max_y))
+        goals = set(self.goal_cells)
+        symmetries = [identity]
+        for a, b, c, d in TRANSFORMS[1:]:
+            # the translation brings the image of the bounding box of the interior back onto it
+            dx = min_x - min(a * x + b * y for x, y in corners)
+            dy = min_y - min(c * x + d * y for x, y in corners)
+            # the goals first: most transforms of an asymmetric level fail on them
+            if any(
+                index.get((a * x + b * y + dx, c * x + d * y + dy)) not in goals
+                for x, y in (cells[goal] for goal in goals)
+            ):
+                continue
+            images = list(identity.cells)
+            for n in interior:
+                x, y = cells[n]
+                image = index.get((a * x + b * y + dx, c * x + d * y + dy), -1)
+                if image not in interior:
+                    break
+                images[n] = image
+            else:
+                directions = tuple(DIRECTIONS.index((a * x + b * y, c * x + d * y)) for x, y in DIRECTIONS)
+                symmetries.append(Symmetry(tuple(images), directions))
+        return tuple(symmetries)
+
+    def flood(self, starts: Iterable[int]) -> FrozenSet[int]:
+        """returns the floor cells connected to the start cells"""
+        grid = numpy_grid(len(self.cells) * len(self.goal_cells))
+        if grid is not None:
+            seeds = grid.cell_array(self, starts)[None, :-1]
+            return frozenset(grid.flood(self, seeds)[0].nonzero()[0].tolist())
+        reached = set(starts)
+        queue = deque(reached)
+        while queue:
+            for n in self.neighbours[queue.popleft()]:
+                if n >= 0 and n not in reached:
+                    reached.add(n)
+                    queue.append(n)
+        return frozenset(reached)
+
+    def pull_distances(self, start: int) -> Tuple[int, ...]:
+        """
+        returns, for every cell, the minimum number of pushes needed to bring a crate from
+        that cell to the start cell on an empty level, computed by pulling the crate from start
+        """
+        neighbours = self.neighbours
+        distances = [UNREACHABLE] * len(self.cells)
+        distances[start] = 0
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            for direction in range(4):
+                origin = neighbours[cell][direction]
+                if origin >= 0 and distances[origin] == UNREACHABLE and neighbours[origin][direction] >= 0:
+                    distances[origin] = distances[cell] + 1
+                    queue.append(origin)
+        return tuple(distances)
+
+    def mask(self, positions: Iterable[Position]) -> int:
+        """returns the bitmask of the given positions"""
+        mask = 0
+        for pos in positions:
+            mask |= 1 << self.index[pos]
+        return mask
+
+    def positions(self, mask: int) -> Tuple[Position, ...]:
+        """returns the positions whose bits are set in the given mask"""
+        cells = self.cells
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(cells[low.bit_length() - 1])
+            mask ^= low
+        return tuple(result)
+
+    def pack(self, crates: int, hero: int) -> int:
+        """packs a (crates, hero) pair in a single int"""
+        return crates << self.hero_bits | hero
+
+    def unpack(self, key: int) -> Tuple[int, int]:
+        """inverse of pack, returns the (crates, hero) pair"""
+        return key >> self.hero_bits, key & ((1 << self.hero_bits) - 1)
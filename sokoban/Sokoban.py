@@ -1,8 +1,14 @@
 """ Classe Sokoban """
-from typing import Tuple, List, Union, Dict, Optional
+import functools
+from collections import deque
+from typing import Callable, Tuple, List, Union, Dict, Optional
 
 from .State import State
+from .Solver import Solver
 from .exceptions import *
+from .functional.sokoban import action_letters
+from .functional.deadlocks import is_deadlock
+from .functional.stats import SolverStats
 
 
 class Sokoban:
@@ -11,8 +17,11 @@ class Sokoban:
     Doit être initialisée avec un objet State.
     """
 
+    directions = {'g': (-1, 0), 'd': (1, 0), 'h': (0, -1), 'b': (0, 1)}
+
     def __init__(self, initial_state: State):
         self.states = [initial_state]
+        self.stats = SolverStats()
 
         self.actions = {
             'g': self.aller_a_gauche,
@@ -25,10 +34,6 @@ class Sokoban:
             'B': self.pousser_en_bas
         }
 
-        self. solving_algorithms = {
-            'bfs': self.solve_bfs,
-        }
-
     @property
     def current_state(self) -> State:
         """
@@ -40,7 +45,7 @@ class Sokoban:
         """
         retourne à l'état précédent s'il existe
         """
-        if self.states[-1] == self.states[0]:
+        if len(self.states) == 1:
             return False
         self.states.pop()
         return True
@@ -51,201 +56,219 @@ class Sokoban:
         """
         self.states = [self.states[0]]
 
-    def aller_a_gauche(self):
+    def deplacement(self, state: State, action: str) -> Optional[State]:
         """
-        déplace le personnage d'une case à gauche si possible
+        renvoie l'état obtenu en jouant l'action depuis state, ou None si l'action est impossible.
+        state et l'historique ne sont pas modifiés
         """
-        x = self.current_state.personnage_pos[0]
-        y = self.current_state.personnage_pos[1]
-        if self.current_state.mur(x - 1, y) or \
-                self.current_state.caisse(x - 1, y) or not \
-                self.current_state.personnage(x, y):
-            return False
+        dx, dy = self.directions[action.lower()]
+        x, y = state.personnage_pos
+        devant = (x + dx, y + dy)
+        if state.mur(*devant):
+            return None
+        if action.isupper():
+            derriere = (x + 2 * dx, y + 2 * dy)
+            if not state.caisse(*devant) or state.mur(*derriere) or state.caisse(*derriere):
+                return None
+            return state.deplacer(devant, devant, derriere)
+        if state.caisse(*devant):
+            return None
+        return state.deplacer(devant)
 
-        new_state = self.current_state.__copy__()
-        new_state.personnage_pos = (x - 1, y)
+    def jouer(self, action: str) -> bool:
+        """
+        joue l'action depuis l'état courant et l'ajoute à l'historique si elle est possible
+        """
+        new_state = self.deplacement(self.current_state, action)
+        if new_state is None:
+            return False
         self.states.append(new_state)
         return True
 
+    def aller_a_gauche(self) -> bool:
+        """
+        déplace le personnage d'une case à gauche si possible
+        """
+        return self.jouer('g')
+
     def aller_a_droite(self) -> bool:
         """
         déplace le personnage d'une case à droite si possible
         """
-        x = self.current_state.personnage_pos[0]
-        y = self.current_state.personnage_pos[1]
-        if self.current_state.mur(x + 1, y) or \
-                self.current_state.caisse(x + 1, y) or \
-                not self.current_state.personnage(x, y):
-            return False
-
-        new_state = self.current_state.__copy__()
-        new_state.personnage_pos = (x + 1, y)
-        self.states.append(new_state)
-        return True
+        return self.jouer('d')
 
     def aller_en_haut(self) -> bool:
         """
         déplace le personnage d'une case en haut si possible
         """
-        x = self.current_state.personnage_pos[0]
-        y = self.current_state.personnage_pos[1]
-        if self.current_state.mur(x, y - 1) \
-                or self.current_state.caisse(x, y - 1) \
-                or not self.current_state.personnage(x, y):
-            return False
-
-        new_state = self.current_state.__copy__()
-        new_state.personnage_pos = (x, y - 1)
-        self.states.append(new_state)
-        return True
+        return self.jouer('h')
 
     def aller_en_bas(self) -> bool:
         """
         déplace le personnage d'une case en bas si possible
         """
-        x = self.current_state.personnage_pos[0]
-        y = self.current_state.personnage_pos[1]
-        if self.current_state.mur(x, y + 1) \
-                or self.current_state.caisse(x, y + 1) \
-                or not self.current_state.personnage(x, y):
-            return False
-
-        new_state = self.current_state.__copy__()
-        new_state.personnage_pos = (x, y + 1)
-        self.states.append(new_state)
-        return True
+        return self.jouer('b')
 
     def pousser_a_gauche(self) -> bool:
         """
         pousse la caisse d'une case à gauche si possible
         """
-        x = self.current_state.personnage_pos[0]
-        y = self.current_state.personnage_pos[1]
-        if self.current_state.mur(x - 1, y) \
-                or not self.current_state.caisse(x - 1, y) \
-                or self.current_state.mur(x - 2, y) \
-                or self.current_state.caisse(x - 2, y) \
-                or not self.current_state.personnage(x, y):
-            return False
-
-        new_state = self.current_state.__copy__()
-        new_state.caisses.remove((x - 1, y))
-        new_state.caisses.append((x - 2, y))
-        new_state.personnage_pos = (x - 1, y)
-        self.states.append(new_state)
-        return True
+        return self.jouer('G')
 
     def pousser_a_droite(self) -> bool:
         """
         pousse la caisse d'une case à droite si possible
         """
-        x = self.current_state.personnage_pos[0]
-        y = self.current_state.personnage_pos[1]
-        if self.current_state.mur(x + 1, y) \
-                or not self.current_state.caisse(x + 1, y) \
-                or self.current_state.mur(x + 2, y) \
-                or self.current_state.caisse(x + 2, y) \
-                or not self.current_state.personnage(x, y):
-            return False
-
-        new_state = self.current_state.__copy__()
-        new_state.caisses.remove((x + 1, y))
-        new_state.caisses.append((x + 2, y))
-        new_state.personnage_pos = (x + 1, y)
-        self.states.append(new_state)
-        return True
+        return self.jouer('D')
 
     def pousser_en_haut(self) -> bool:
         """
         pousse la caisse d'une case en haut si possible
         """
-        x = self.current_state.personnage_pos[0]
-        y = self.current_state.personnage_pos[1]
-        if self.current_state.mur(x, y - 1) \
-                or not self.current_state.caisse(x, y - 1) \
-                or self.current_state.mur(x, y - 2) \
-                or self.current_state.caisse(x, y - 2) \
-                or not self.current_state.personnage(x, y):
-            return False
-
-        new_state = self.current_state.__copy__()
-        new_state.caisses.remove((x, y - 1))
-        new_state.caisses.append((x, y - 2))
-        new_state.personnage_pos = (x, y - 1)
-        self.states.append(new_state)
-        return True
+        return self.jouer('H')
 
     def pousser_en_bas(self) -> bool:
         """
         pousse la caisse d'une case en bas si possible
         """
-        x = self.current_state.personnage_pos[0]
-        y = self.current_state.personnage_pos[1]
-        if self.current_state.mur(x, y + 1) \
-                or not self.current_state.caisse(x, y + 1) \
-                or self.current_state.mur(x, y + 2) \
-                or self.current_state.caisse(x, y + 2) \
-                or not self.current_state.personnage(x, y):
-            return False
-
-        new_state = self.current_state.__copy__()
-        new_state.caisses.remove((x, y + 1))
-        new_state.caisses.append((x, y + 2))
-        new_state.personnage_pos = (x, y + 1)
-        self.states.append(new_state)
-        return True
+        return self.jouer('B')
 
     def execute(self, actions: str) -> bool:
         """
         exécute une liste d'actions
         """
         for action in actions:
-            try:
-                res = self.actions[action]()
-            except KeyError:
+            if action not in self.actions:
                 raise NotRecognizedActionException(
                     f"Action inconnue: {action}\n"
                     +
                     ErrorHelpStrings.NOT_RECOGNIZED_ACTION_HELP
                 )
-            finally:
-                if not res:
-                    raise UndoableActionException(
-                        f"action {action} at position {self.current_state.personnage_pos} impossible\n"
-                        +
-                        ErrorHelpStrings.UNDOABLE_ACTION_HELP
-                    )
+            if not self.actions[action]():
+                raise UndoableActionException(
+                    f"action {action} at position {self.current_state.personnage_pos} impossible\n"
+                    +
+                    ErrorHelpStrings.UNDOABLE_ACTION_HELP
+                )
         return True
 
-    def solve(self, algorithm='bfs'):
-        """
-        solve the puzzle
-        """
-        if algorithm in self.solving_algorithms:
-            return self.solving_algorithms[algorithm]()
-        else:
-            raise NotRecognizedAlgorithmException(
-                f"Algorithme inconnu: {algorithm}\n"
-                +
-                ErrorHelpStrings.NOT_RECOGNIZED_ALGORITHM_HELP
-            )
+    @property
+    def solving_algorithms(self) -> Dict[str, Callable[..., Optional[str]]]:
+        """
+        solvers of the game by algorithm name: solving_algorithms[name](**options) is solve(name, **options).
+        the capabilities of the algorithms are in Solver.algorithms
+        """
+        return {name: functools.partial(self.solve, name) for name in Solver.algorithms}
+
+    def solve(self, algorithm='bfs', **options) -> Optional[str]:
+        """
+        solve the puzzle with an algorithm of the Solver registry and play the actions of its solution,
+        options are passed to the solving algorithm (e.g. workers for hda*, stats for all of them)
+        """
+        state = self.current_state
+        level = state.level
+        solver = Solver(level)
+        try:
+            indices = solver.solve(level.mask(state.caisses), level.index[state.personnage_pos], algorithm, **options)
+        finally:
+            self.stats = solver.stats
+        if indices is None:
+            return None
+        actions = "".join(action_letters[n] for n in indices)
+        self.execute(actions)
+        return actions
+
+    def solve_bfs(self, stats: Optional[SolverStats] = None) -> Optional[str]:
+        """
+        solve the puzzle using breadth-first search over State objects (solve('bfs') runs the
+        bitboard version), stats may be given to follow the search with a progress callback
+        """
+        self.stats = stats or SolverStats()
+        queue = deque([self.current_state])
+        predecessors: Dict[State, Optional[Tuple[State, str]]] = {self.current_state: None}
+        with self.stats.phase("search"):
+            while queue:
+                state = queue.popleft()
+                self.stats.expanded += 1
+                if self.stats.expanded >= self.stats.next_check:
+                    self.stats.report()
+                if state.is_valid():
+                    break
+                for action, new_state in self.successeurs(state):
+                    self.stats.generated += 1
+                    if self.poussee_bloquante(action, new_state):
+                        self.stats.pruned += 1
+                        continue
+                    if new_state in predecessors:
+                        self.stats.duplicates += 1
+                        continue
+                    predecessors[new_state] = (state, action)
+                    queue.append(new_state)
+                if len(queue) > self.stats.frontier_peak:
+                    self.stats.frontier_peak = len(queue)
+            else:
+                return None
+        with self.stats.phase("path"):
+            states, actions = self.reconstruct_path(state, predecessors)
+        self.stats.depth = len(actions)
+        self.states = states
+        return actions
+
+    def solve_pushes(self, stats: Optional[SolverStats] = None) -> Optional[str]:
+        """
+        solve the puzzle using a breadth-first search over crate pushes only,
+        the walking segments between pushes are filled back in the returned actions
+        """
+        return self.solve('pushes', stats=stats)
+
+    def solve_astar(self, stats: Optional[SolverStats] = None) -> Optional[str]:
+        """
+        solve the puzzle using an A* search over crate pushes (push-optimal)
+        """
+        return self.solve('astar', stats=stats)
+
+    def solve_idastar(self, stats: Optional[SolverStats] = None) -> Optional[str]:
+        """
+        solve the puzzle using IDA* over crate pushes (push-optimal, memory in O(depth))
+        """
+        return self.solve('idastar', stats=stats)
+
+    def solve_bidirectional(self, stats: Optional[SolverStats] = None) -> Optional[str]:
+        """
+        solve the puzzle using a bidirectional search: pushes from the current state, pulls from the solved states
+        """
+        return self.solve('bidirectional', stats=stats)
+
+    def solve_hda(self, workers: Optional[int] = None, stats: Optional[SolverStats] = None) -> Optional[str]:
+        """
+        solve the puzzle using hash-distributed A* over crate pushes, on workers processes (push-optimal)
+        """
+        return self.solve('hda*', workers=workers, stats=stats)
 
-    def solve_bfs(self) -> Optional[str]:
-        """
-        solve the puzzle using breadth-first search
-        """
-        self.states = [self.current_state]
-        predecessors = {}
-        while self.states:
-            state = self.states.pop(0)
-            if state.is_valid():
-                states, actions = self.reconstruct_path(state, predecessors)
-                self.states = states
-                return actions
-            for action in self.actions:
-                if self.actions[action]():
-                    predecessors[self.current_state] = (state, action)
-        return None
+    def poussee_bloquante(self, action: str, state: State) -> bool:
+        """
+        renvoie True si l'action est une poussée qui a amené une caisse sur une case morte
+        ou dans une situation bloquée, state étant l'état obtenu après l'action
+        """
+        if not action.isupper():
+            return False
+        dx, dy = self.directions[action.lower()]
+        x, y = state.personnage_pos
+        caisse, level = (x + dx, y + dy), state.level
+        if caisse in level.dead_squares:
+            return True
+        return is_deadlock(level, lambda cell: state.caisse(*level.cells[cell]), level.index[caisse])
+
+    def successeurs(self, state: State) -> List[Tuple[str, State]]:
+        """
+        renvoie les couples (action, état) accessibles depuis un état, sans modifier l'historique
+        """
+        successeurs = []
+        for action in self.actions:
+            new_state = self.deplacement(state, action)
+            if new_state is not None:
+                successeurs.append((action, new_state))
+        return successeurs
 
     def reconstruct_path(self, state: State, predecessors: Dict[State, Optional[Tuple[State, str]]]) -> Tuple[List[State], str]:
         """
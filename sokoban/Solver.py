@@ -1,63 +1,146 @@
 """ Sokoban Solver """
-from typing import List, Tuple, Optional, Dict
-from . import Sokoban, State
+import importlib
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Union
+
+from .Level import Level
 from .exceptions import *
+from .functional import bitboard, pushes, astar, anytime, iterative, bidirectional
+from .functional.stats import SolverStats
+
+if TYPE_CHECKING:
+    from .functional.cache import SolutionCache
+
+Algorithm = NamedTuple(
+    "Algorithm",
+    [
+        ("name", str),
+        # search(level, crates bitmask, hero cell, stats=..., **options) -> list of pushes / action indices, or None,
+        # or its "module:function" path, relative to the sokoban package, imported on first use (see Solver.resolve)
+        ("search", Union[Callable, str]),
+        ("moves", bool),  # True if search returns action indices, False if it returns pushes
+        ("optimal", Optional[str]),  # 'moves', 'pushes', or None if the solutions are not optimal
+        ("memory_bounded", bool),  # memory in O(depth) instead of O(visited nodes)
+        ("parallel", bool),  # runs on several processes
+        ("cost", int),  # rank by total time on the benchmark corpus, lower is cheaper (see Solver.select)
+    ],
+)
 
 
 class Solver:
     """
-    Collection of methods to solve Sokoban
+    Registry of the solving algorithms, and solver of the positions of a Level.
+    Every algorithm searches from a (crates bitmask, hero cell) pair of the Level (see Level.mask).
     """
-    def __init__(self, initial_state: Sokoban):
-        self.sokoban = sokoban
 
-    def successors(self, state: State) -> List[Tuple[str, State]]:
+    algorithms: Dict[str, Algorithm] = {}
+
+    def __init__(self, level: Level):
+        self.level = level
+        self.stats = SolverStats()
+
+    @classmethod
+    def register(
+        cls,
+        name: str,
+        search: Union[Callable, str],
+        moves: bool = False,
+        optimal: Optional[str] = None,
+        memory_bounded: bool = False,
+        parallel: bool = False,
+        cost: Optional[int] = None,
+    ) -> Algorithm:
         """
-        renvoie les successeurs d'un état
+        registers (or replaces) a solving algorithm and its capabilities. cost defaults to the cost of
+        the replaced algorithm, or ranks a new one after the most expensive registered one
         """
-        return [
-            (
-                action,
-                state.__copy__()
-            )
-            for action in self.sokoban.actions
-            if self.sokoban.actions[action]()
+        if optimal not in (None, 'moves', 'pushes'):
+            raise ValueError(f"optimal must be 'moves', 'pushes' or None, not {optimal!r}")
+        if cost is None:
+            if name in cls.algorithms:
+                cost = cls.algorithms[name].cost
+            else:
+                cost = max((algorithm.cost for algorithm in cls.algorithms.values()), default=0) + 1
+        algorithm = Algorithm(name, search, moves, optimal, memory_bounded, parallel, cost)
+        cls.algorithms[name] = algorithm
+        return algorithm
+
+    @classmethod
+    def resolve(cls, name: str) -> Algorithm:
+        """
+        returns the registered algorithm, its search imported if it was registered by its path
+        """
+        algorithm = cls.algorithms[name]
+        if isinstance(algorithm.search, str):
+            module, function = algorithm.search.split(":")
+            algorithm = algorithm._replace(search=getattr(importlib.import_module(module, __package__), function))
+            cls.algorithms[name] = algorithm
+        return algorithm
+
+    @classmethod
+    def select(
+        cls,
+        optimal: Optional[str] = None,
+        memory_bounded: Optional[bool] = None,
+        parallel: Optional[bool] = None,
+    ) -> List[str]:
+        """
+        names of the algorithms with the requested capabilities (None: any), cheapest first (see Algorithm.cost)
+        """
+        selected = [
+            algorithm for algorithm in cls.algorithms.values()
+            if (optimal is None or algorithm.optimal == optimal)
+            and (memory_bounded is None or algorithm.memory_bounded == memory_bounded)
+            and (parallel is None or algorithm.parallel == parallel)
         ]
+        return [algorithm.name for algorithm in sorted(selected, key=lambda algorithm: algorithm.cost)]
 
-    def solve(self, algorithm='bfs'):
+    def solve(
+        self,
+        crates: int,
+        hero: int,
+        algorithm: str = 'bfs',
+        stats: Optional[SolverStats] = None,
+        cache: Optional["SolutionCache"] = None,
+        **options,
+    ) -> Optional[List[int]]:
         """
-        solve the puzzle
+        solve the position, returns the list of action indices (see functional.sokoban.actions)
+        of a solution or None. options are passed to the algorithm (e.g. workers for hda*).
+        the solution is looked up in cache first, and stored there once found
         """
-        if algorithm in self.solving_algorithms:
-            return self.solving_algorithms[algorithm]()
-        else:
+        if algorithm not in self.algorithms:
             raise NotRecognizedAlgorithmException(
                 f"Algorithme inconnu: {algorithm}\n"
                 +
                 ErrorHelpStrings.NOT_RECOGNIZED_ALGORITHM_HELP
             )
-
-    def solve_bfs(self):
-        """
-        solve the puzzle using breadth-first search
-        """
-        queue = [self.current_state]
-        while queue:
-            state = queue.pop(0)
-            if state.is_valid():
-                return state
-            else:
-                queue.extend(state.successors())
-        return None
+        entry = self.resolve(algorithm)
+        self.stats = stats if stats is not None else SolverStats()
+        if cache is not None:
+            indices = cache.get(self.level, crates, hero, algorithm, entry.moves, self.stats)
+            if indices is not None:
+                return indices
+        result = entry.search(self.level, crates, hero, stats=self.stats, **options)
+        if result is None:
+            return None
+        if entry.moves:
+            indices = result
+        else:
+            with self.stats.phase("expand"):
+                indices = pushes.expand(self.level, crates, hero, result)
+        if cache is not None:
+            cache.put(self.level, crates, hero, algorithm, entry.moves, indices, self.stats)
+        return indices
 
 
-    def reconstruct_path(self, state: State, precedents: Dict[State, Optional[Tuple[State, str]]]) -> str:
-        """
-        reconstruct the path from a state to the initial state
-        """
-        path = ""
-        s = state
-        while precedents[s]:
-            path += precedents[s][1]
-            s = precedents[s][0]
-        return path[::-1]
\ No newline at end of file
+# costs: total time of the functional engines on the benchmark corpus, each run cut at 5 seconds
+Solver.register('astar', astar.astar_pushes, optimal='pushes', cost=1)
+# push-optimal only when it runs to its end, without budget (see anytime.anytime_pushes)
+Solver.register('anytime', anytime.anytime_pushes, cost=2)
+Solver.register('idastar', iterative.ida_star_pushes, optimal='pushes', memory_bounded=True, cost=3)
+Solver.register('bidirectional', bidirectional.bidirectional_pushes, cost=4)
+Solver.register('pushes', pushes.bfs_pushes, optimal='pushes', cost=5)
+# the bitboard breadth-first search, Sokoban.solve_bfs is the one over State objects (not registered)
+Solver.register('bfs', bitboard.bfs_moves, moves=True, optimal='moves', cost=6)
+# multiprocessing is only imported when hda* is used; ranked last, as it only pays off with several cores
+Solver.register('hda*', '.functional.parallel:hda_star_pushes', optimal='pushes', parallel=True, cost=7)
@@ -1,5 +1,8 @@
 """ Classe State """
-from typing import Tuple, List
+from typing import Tuple, List, Optional, FrozenSet
+
+from .Level import Level
+from .exceptions import InvalidLevelException, ErrorHelpStrings
 
 
 def load_from_string(state_string: str) -> \
@@ -11,12 +14,13 @@ def load_from_string(state_string: str) -> \
         ]:
     """
     Charge un état à partir d'une chaîne de caractères.
+    Les lignes plus courtes que la plus longue sont complétées par du vide.
     """
-    murs, buts, caisses, personnage_pos = [], [], [], (0, 0)
+    murs, buts, caisses, personnage_pos = [], [], [], None
     lines = [l for l in state_string.split('\n') if l != '']
-    w, h = len(lines[0]), len(lines)
+    w, h = max(len(l) for l in lines), len(lines)
     for y in range(h):
-        for x in range(w):
+        for x in range(len(lines[y])):
             if lines[y][x] == '%':
                 murs.append((x, y))
             elif lines[y][x] == 'b':
@@ -31,6 +35,12 @@ def load_from_string(state_string: str) -> \
             elif lines[y][x] == 'q':
                 personnage_pos = (x, y)
                 buts.append((x, y))
+    if personnage_pos is None:
+        raise InvalidLevelException(
+            "Personnage absent du niveau\n"
+            +
+            ErrorHelpStrings.INVALID_LEVEL_HELP
+        )
     return murs, buts, caisses, personnage_pos, (w, h)
 
 
@@ -38,13 +48,74 @@ class State:
     """
     Classe de représentation d'un état de jeu.
     Doit être initialisée avec une chaîne de caractères correspondant à l'état.
+    Les données statiques (murs, buts, taille) sont dans un Level partagé par tous les états.
+    Un état est une valeur: ses caisses sont un frozenset et son hash de Zobrist est calculé
+    à sa création, un déplacement renvoie un nouvel état (voir deplacer), en O(1) pour le
+    personnage et O(caisses) pour une poussée.
     """
 
     def __init__(self, state_string: str) -> None:
-        self.murs, self.buts, self.caisses, self.personnage_pos, self.map_size = load_from_string(state_string)
+        murs, buts, caisses, personnage_pos, map_size = load_from_string(state_string)
+        self.level = Level(murs, buts, map_size)
+        self.caisses: FrozenSet[Tuple[int, int]] = frozenset(caisses)
+        self._personnage_pos = personnage_pos
+        self.zobrist = self.level.zobrist(self.caisses, personnage_pos)
 
     def __copy__(self) -> 'State':
-        return State(self.__string__())
+        # the fields are immutable, a copy shares them
+        return self.deplacer(self._personnage_pos)
+
+    def deplacer(
+        self,
+        personnage_pos: Tuple[int, int],
+        depart: Optional[Tuple[int, int]] = None,
+        arrivee: Optional[Tuple[int, int]] = None,
+    ) -> 'State':
+        """
+        Renvoie l'état où le personnage est en personnage_pos, et où la caisse de la case depart
+        (s'il y en a une) a été déplacée en arrivee. L'état courant n'est pas modifié.
+        """
+        state = State.__new__(State)
+        state.level = self.level
+        zobrist = self.zobrist ^ self.level.hero_keys[self._personnage_pos] ^ self.level.hero_keys[personnage_pos]
+        if depart is not None:
+            state.caisses = self.caisses.difference((depart,)).union((arrivee,))
+            zobrist ^= self.level.crate_keys[depart] ^ self.level.crate_keys[arrivee]
+        else:
+            state.caisses = self.caisses
+        state._personnage_pos = personnage_pos
+        state.zobrist = zobrist
+        return state
+
+    def __hash__(self) -> int:
+        return self.zobrist
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, State):
+            return NotImplemented
+        return self.zobrist == other.zobrist \
+            and self._personnage_pos == other._personnage_pos \
+            and self.caisses == other.caisses
+
+    @property
+    def murs(self) -> FrozenSet[Tuple[int, int]]:
+        """ murs du niveau """
+        return self.level.walls
+
+    @property
+    def buts(self) -> FrozenSet[Tuple[int, int]]:
+        """ buts du niveau """
+        return self.level.goals
+
+    @property
+    def map_size(self) -> Tuple[int, int]:
+        """ taille du niveau """
+        return self.level.map_size
+
+    @property
+    def personnage_pos(self) -> Tuple[int, int]:
+        """ position du personnage """
+        return self._personnage_pos
 
     def personnage(self, x: int, y: int) -> bool:
         """
@@ -60,9 +131,9 @@ class State:
 
     def mur(self, x: int, y: int) -> bool:
         """
-        Renvoie True si la case (x, y) est un mur.
+        Renvoie True si la case (x, y) est un mur (ou hors du niveau).
         """
-        return (x, y) in self.murs
+        return (x, y) not in self.level.index
 
     def caisse(self, x: int, y: int) -> bool:
         """
@@ -74,10 +145,7 @@ class State:
         """
         Renvoie True si l'état est valide (toutes les caisses sont sur un but).
         """
-        for caisse in self.caisses:
-            if caisse not in self.buts:
-                return False
-        return True
+        return self.caisses <= self.buts
 
     def __string__(self) -> str:
         text = ''
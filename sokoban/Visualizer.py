@@ -1,4 +1,7 @@
 """ Classe de visualisation de Sokoban """
+import functools
+from typing import Tuple
+
 import pygame
 from .Sokoban import Sokoban
 from .State import State
@@ -12,36 +15,41 @@ from .assets import sprites
 SCREEN_SIZE = (700, 700)
 FPS = 24
 
-with pkg_resources.path(sprites, "hero.png") as path:
-    HERO_SPRITE = pygame.image.load(path)
-with pkg_resources.path(sprites, "crate.png") as path:
-    CRATE_SPRITE = pygame.image.load(path)
-with pkg_resources.path(sprites, "goal.png") as path:
-    GOAL_SPRITE = pygame.image.load(path)
-with pkg_resources.path(sprites, "wall.png") as path:
-    WALL_SPRITE = pygame.image.load(path)
-with pkg_resources.path(sprites, "floor.png") as path:
-    FLOOR_SPRITE = pygame.image.load(path)
-with pkg_resources.path(sprites, "crate_goal.png") as path:
-    CRATE_GOAL_SPRITE = pygame.image.load(path)
+
+@functools.lru_cache(maxsize=None)
+def load_sprite(name: str) -> pygame.Surface:
+    """charge un sprite des assets (hero, crate, goal, wall, floor, crate_goal) au premier usage"""
+    with pkg_resources.path(sprites, f"{name}.png") as path:
+        return pygame.image.load(path)
+
+
+@functools.lru_cache(maxsize=None)
+def scaled_sprite(name: str, size: Tuple[int, int]) -> pygame.Surface:
+    """sprite redimensionné à la taille d'une case, gardé en cache pour chaque taille"""
+    return pygame.transform.scale(load_sprite(name), size)
 
 
 class Visualizer:
     """
     Classe de visualisation d'un jeu Sokoban
     """
-    def __init__(self, sokoban: Sokoban) -> None:
+    def __init__(self, sokoban: Sokoban, show_dead_squares: bool = False) -> None:
         pygame.init()
         self.Sokoban = sokoban
+        self.show_dead_squares = show_dead_squares
         self.map_size = sokoban.current_state.map_size
         self.case_size = (SCREEN_SIZE[0] // self.map_size[0], SCREEN_SIZE[1] // self.map_size[1])
         # resize the sprites to fit in a case
-        self.hero_sprite = pygame.transform.scale(HERO_SPRITE, self.case_size)
-        self.crate_sprite = pygame.transform.scale(CRATE_SPRITE, self.case_size)
-        self.goal_sprite = pygame.transform.scale(GOAL_SPRITE, self.case_size)
-        self.wall_sprite = pygame.transform.scale(WALL_SPRITE, self.case_size)
-        self.crate_goal_sprite = pygame.transform.scale(CRATE_GOAL_SPRITE, self.case_size)
-        self.floor_sprite = pygame.transform.scale(FLOOR_SPRITE, self.case_size)
+        self.hero_sprite = scaled_sprite("hero", self.case_size)
+        self.crate_sprite = scaled_sprite("crate", self.case_size)
+        self.goal_sprite = scaled_sprite("goal", self.case_size)
+        self.wall_sprite = scaled_sprite("wall", self.case_size)
+        self.crate_goal_sprite = scaled_sprite("crate_goal", self.case_size)
+        self.floor_sprite = scaled_sprite("floor", self.case_size)
+        # red shade over the cells from which a crate can never reach a goal
+        self.dead_square_sprite = pygame.Surface(self.case_size)
+        self.dead_square_sprite.set_alpha(80)
+        self.dead_square_sprite.fill((255, 0, 0))
 
         # initialize font
         self.font = pygame.font.SysFont("monospace", 20)
@@ -81,6 +89,8 @@ class Visualizer:
                         screen.blit(self.wall_sprite, (x * self.case_size[0], y * self.case_size[1]))
                     else:
                         screen.blit(self.floor_sprite, (x * self.case_size[0], y * self.case_size[1]))
+                    if self.show_dead_squares and (x, y) in state.level.dead_squares:
+                        screen.blit(self.dead_square_sprite, (x * self.case_size[0], y * self.case_size[1]))
                     if state.personnage(x, y):
                         screen.blit(self.hero_sprite, (x * self.case_size[0], y * self.case_size[1]))
 
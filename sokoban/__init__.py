@@ -1,6 +1,18 @@
 """
 Module MVC pour le jeu Sokoban.
+Le Visualizer (et pygame) n'est importé qu'au premier accès à sokoban.Visualizer,
+le modèle et les solveurs s'utilisent sans pygame.
 """
 from .Sokoban import Sokoban
 from .State import State
-from .Visualizer import Visualizer
\ No newline at end of file
+from .Level import Level
+from .Solver import Solver
+
+
+def __getattr__(name):
+    if name == "Visualizer":
+        from .Visualizer import Visualizer
+        # the import set sokoban.Visualizer to the module, the class replaces it
+        globals()["Visualizer"] = Visualizer
+        return Visualizer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
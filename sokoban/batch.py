@@ -0,0 +1,212 @@
+""" Batch solving of level collections on a pool of processes
+
+Levels are given as text (the project alphabet) or as xsb.Puzzle: each
+worker parses its own level, so only level text and JSON-ready results cross
+process boundaries. Levels are submitted lazily, a few per worker at a time,
+and results are yielded, and printed as JSON lines by the command line
+interface, as soon as a worker finishes.
+
+usage: python -m sokoban.batch levels.sok [--algorithm astar] [--workers 4]
+                                [--time-limit 10] [--memory-limit 512] [--cache solutions.sqlite]
+XSB/.sok packs are read with sokoban.xsb; files in the project alphabet
+(.txt, one level per paragraph) are read with split_levels.
+"""
+import argparse
+import json
+import os
+import resource
+import signal
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, Dict, Optional, List, Tuple, Union
+
+from .exceptions import BudgetExceededException, NotRecognizedAlgorithmException, ErrorHelpStrings
+from . import functional as f
+from .xsb import Puzzle, read_levels
+
+# hda* is left out: the levels are already spread over the processes of the pool
+ALGORITHMS = {name: solve for name, solve in f.solving_algorithms.items() if name != 'hda*'}
+
+
+def split_levels(text: str) -> List[str]:
+    """splits a text holding several levels separated by blank lines"""
+    levels, lines = [], []
+    for line in text.split('\n'):
+        if line.strip():
+            lines.append(line)
+        elif lines:
+            levels.append('\n'.join(lines) + '\n')
+            lines = []
+    if lines:
+        levels.append('\n'.join(lines) + '\n')
+    return levels
+
+
+def on_alarm(signum, frame):
+    raise BudgetExceededException("time budget exceeded")
+
+
+def memory_usage() -> int:
+    """virtual memory size of the current process, in bytes"""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[0]) * resource.getpagesize()
+
+
+def solve_level(
+    index: int, level: str, algorithm: str, time_limit: Optional[float], memory_limit: Optional[int],
+    cache: Optional[str] = None,
+) -> Dict:
+    """
+    solves one level inside a worker process, within its time (seconds) and memory (MiB) budgets,
+    cache is the path of a SolutionCache shared by the workers (None: no cache)
+    """
+    result = {'index': index}
+    previous_limit = resource.getrlimit(resource.RLIMIT_AS)
+    solution_cache = f.SolutionCache(cache) if cache is not None else None
+    start = time.perf_counter()
+    try:
+        try:
+            if time_limit:
+                signal.signal(signal.SIGALRM, on_alarm)
+                signal.setitimer(signal.ITIMER_REAL, time_limit)
+            if memory_limit:
+                resource.setrlimit(resource.RLIMIT_AS, (memory_usage() + memory_limit * 2 ** 20, previous_limit[1]))
+            stats = f.SolverStats()
+            actions = ALGORITHMS[algorithm](f.load_from_string(level), stats=stats, cache=solution_cache)
+            # disarmed first: a late alarm must not turn a solved level into a timeout
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            solution = f.actions_to_string(actions)
+            result.update(
+                status='solved',
+                solution=solution,
+                moves=len(solution),
+                pushes=sum(1 for action in solution if action.isupper()),
+                **stats.as_dict(),
+            )
+        except f.NoSolutionException:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            result['status'] = 'unsolvable'
+        except BudgetExceededException:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            result['status'] = 'timeout'
+        except MemoryError:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            result['status'] = 'memory'
+        except Exception as error:  # a broken level must not stop the batch
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            result.update(status='error', error=f"{type(error).__name__}: {error}")
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            resource.setrlimit(resource.RLIMIT_AS, previous_limit)
+            if solution_cache is not None:
+                solution_cache.close()
+    except BudgetExceededException:
+        # the alarm went off between the end of the search and its disarming
+        if 'status' not in result:
+            result['status'] = 'timeout'
+    result['time'] = time.perf_counter() - start
+    return result
+
+
+def solve_batch(
+    levels: Iterable[Union[str, Puzzle]],
+    algorithm: str = 'astar',
+    workers: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    cache: Optional[str] = None,
+) -> Iterator[Dict]:
+    """
+    solves levels on a pool of workers processes, yields a result dict per level as soon as it is ready
+    (the 'index' key gives the position of the level in levels, 'title' the title of a Puzzle)
+    """
+    if algorithm not in ALGORITHMS:
+        raise NotRecognizedAlgorithmException(
+            f"Algorithme inconnu: {algorithm}\n"
+            +
+            ErrorHelpStrings.NOT_RECOGNIZED_ALGORITHM_HELP
+        )
+    workers = workers or os.cpu_count() or 1
+    levels = enumerate(levels)
+    titles: Dict[int, Optional[str]] = {}
+    arguments = (algorithm, time_limit, memory_limit, cache)
+
+    def finish(result: Dict) -> Dict:
+        title = titles.pop(result['index'], None)
+        if title is not None:
+            result['title'] = title
+        return result
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        submitted: Dict[Future, Tuple[int, str]] = {}
+        while True:
+            # keep a couple of levels per worker in flight, the rest of the pack is not read yet
+            for index, level in levels:
+                if isinstance(level, Puzzle):
+                    titles[index] = level.title
+                    level = level.board
+                submitted[executor.submit(solve_level, index, level, *arguments)] = (index, level)
+                if len(submitted) >= 2 * workers:
+                    break
+            if not submitted:
+                return
+            done, _ = wait(submitted, return_when=FIRST_COMPLETED)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                # a worker died (memory limit hit in native code, crash, OOM kill): every level in flight
+                # fails with it, they are solved again one at a time to find the one which killed it
+                wait(submitted)
+                done = set(submitted)
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(max_workers=workers)
+            for future in done:
+                index, level = submitted.pop(future)
+                if isinstance(future.exception(), BrokenProcessPool):
+                    yield finish(solve_isolated(index, level, *arguments))
+                else:
+                    yield finish(future.result())
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def solve_isolated(
+    index: int, level: str, algorithm: str, time_limit: Optional[float], memory_limit: Optional[int],
+    cache: Optional[str] = None,
+) -> Dict:
+    """solves a level alone in a new worker process, reports the level if the process dies"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            return executor.submit(solve_level, index, level, algorithm, time_limit, memory_limit, cache).result()
+        except BrokenProcessPool:
+            return {
+                'index': index,
+                'status': 'memory' if memory_limit else 'error',
+                'error': "the worker process died",
+            }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Solve a collection of Sokoban levels, one JSON line per level")
+    parser.add_argument('levels', help="XSB/.sok pack, or file of levels in the project alphabet ('-' for stdin)")
+    parser.add_argument('--algorithm', default='astar', choices=sorted(ALGORITHMS))
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--time-limit', type=float, default=None, help="seconds per level")
+    parser.add_argument('--memory-limit', type=int, default=None, help="MiB per level")
+    parser.add_argument('--cache', default=None, help="sqlite file of a solution cache shared by the runs")
+    args = parser.parse_args(argv)
+
+    if args.levels.endswith(('.sok', '.xsb')):
+        levels = read_levels(args.levels)
+    elif args.levels == '-':
+        levels = split_levels(sys.stdin.read())
+    else:
+        with open(args.levels) as file:
+            levels = split_levels(file.read())
+    for result in solve_batch(levels, args.algorithm, args.workers, args.time_limit, args.memory_limit, args.cache):
+        print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+    main()
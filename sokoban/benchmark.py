@@ -0,0 +1,278 @@
+""" Benchmark of the solvers over a corpus of levels, with regression tracking
+
+Every algorithm of both engines (the breadth-first search over State objects
+of Sokoban.solve_bfs for the object-oriented one, functional.solving_algorithms
+for the functional one) is run on every level of the corpus, each run in a
+fresh process so that its peak memory is its own and a run past its time limit
+can be killed. A run records its wall time, nodes expanded, nodes per second,
+peak RSS (and the peak traced by tracemalloc with --tracemalloc, which slows
+the solvers down) and the length of its solution. Results are written as JSON;
+the compare mode flags the regressions of a run against a saved baseline.
+
+usage: python -m sokoban.benchmark run [--levels pack.sok] [--engine functional]
+                                       [--algorithm astar] [--time-limit 10]
+                                       [--repeat 3] [--output results.json]
+       python -m sokoban.benchmark compare baseline.json results.json [--threshold 0.2]
+The default corpus is assets/levels/benchmark.sok, from the levels of main.py
+up to classic levels that the blind searches cannot solve in time (the two
+corridor levels compare bidirectional with pushes on long push sequences).
+"""
+import argparse
+import datetime
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import signal
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from importlib.resources import files
+except ImportError:
+    from importlib_resources import files  # python <3.9
+
+from .assets import levels as corpus
+from .exceptions import NotRecognizedAlgorithmException, ErrorHelpStrings
+from .xsb import Puzzle, read_levels
+from . import functional as f
+
+ENGINES = ('oo', 'functional')
+# searches of the object-oriented engine by name: the other Sokoban.solve_* methods go through
+# the Solver registry, which runs the functional searches already measured by the functional engine
+OO_ALGORITHMS = {'bfs': 'solve_bfs'}
+# runs faster than this (seconds) are too noisy to be compared
+MIN_TIME = 0.05
+
+
+def algorithms(engine: str) -> List[str]:
+    """names of the algorithms of an engine"""
+    if engine == 'oo':
+        return list(OO_ALGORITHMS)
+    return list(f.solving_algorithms)
+
+
+def load_corpus(path: Optional[str] = None) -> List[Puzzle]:
+    """levels of a pack, the bundled corpus by default"""
+    if path is not None:
+        return list(read_levels(path))
+    with files(corpus).joinpath("benchmark.sok").open(encoding='utf-8') as file:
+        return list(read_levels(file))
+
+
+def run_solver(board: str, engine: str, algorithm: str, trace: bool) -> Dict:
+    """solves a level in the current process, returns the measures of the run"""
+    if trace:
+        tracemalloc.start()
+    if engine == 'oo':
+        from .Sokoban import Sokoban
+        from .State import State
+        sokoban = Sokoban(State(board))
+        stats = f.SolverStats()
+        start = time.perf_counter()
+        solution = getattr(sokoban, OO_ALGORITHMS[algorithm])(stats=stats)
+        elapsed = time.perf_counter() - start
+    else:
+        stats = f.SolverStats()
+        state = f.load_from_string(board)
+        start = time.perf_counter()
+        try:
+            solution = f.actions_to_string(f.solving_algorithms[algorithm](state, stats=stats))
+        except f.NoSolutionException:
+            solution = None
+        elapsed = time.perf_counter() - start
+    result = {
+        'status': 'solved' if solution is not None else 'unsolvable',
+        'time': elapsed,
+        **stats.as_dict(),
+        'nodes_per_sec': stats.expanded / elapsed if elapsed > 0 else 0.0,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+    if trace:
+        result['peak_traced'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if solution is not None:
+        result['moves'] = len(solution)
+        result['pushes'] = sum(1 for action in solution if action.isupper())
+    return result
+
+
+def child(connection, board: str, engine: str, algorithm: str, trace: bool) -> None:
+    """entry point of the process of a run, sends its result back through connection"""
+    os.setpgrp()  # the run and the processes it starts (hda*) are killed together
+    try:
+        result = run_solver(board, engine, algorithm, trace)
+    except Exception as error:
+        result = {'status': 'error', 'error': f"{type(error).__name__}: {error}"}
+    connection.send(result)
+    connection.close()
+
+
+def measure(board: str, engine: str, algorithm: str, time_limit: Optional[float], trace: bool = False) -> Dict:
+    """runs a solver on a level in a fresh process, killed after time_limit seconds"""
+    receiver, sender = mp.Pipe(duplex=False)
+    process = mp.Process(target=child, args=(sender, board, engine, algorithm, trace))
+    start = time.perf_counter()
+    process.start()
+    sender.close()
+    if receiver.poll(time_limit):
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = {'status': 'error', 'error': f"exit code {process.exitcode}"}
+    else:
+        result = {'status': 'timeout', 'time': time.perf_counter() - start}
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.join()
+    receiver.close()
+    return result
+
+
+def run_benchmark(
+    puzzles: Iterable[Puzzle],
+    engines: Iterable[str] = ENGINES,
+    names: Optional[Iterable[str]] = None,
+    time_limit: Optional[float] = 10,
+    repeat: int = 1,
+    trace: bool = False,
+    log=None,
+) -> List[Dict]:
+    """
+    runs the algorithms (all of them by default) of engines on every puzzle,
+    keeps the fastest of repeat runs, returns a result dict per (level, engine, algorithm)
+    """
+    engines = list(engines)
+    known = {name for engine in engines for name in algorithms(engine)}
+    for algorithm in names or ():
+        if algorithm not in known:
+            raise NotRecognizedAlgorithmException(
+                f"Algorithme inconnu: {algorithm}\n"
+                +
+                ErrorHelpStrings.NOT_RECOGNIZED_ALGORITHM_HELP
+            )
+    results = []
+    for index, puzzle in enumerate(puzzles):
+        level = puzzle.title if puzzle.title is not None else str(index)
+        for engine in engines:
+            registered = algorithms(engine)
+            # an algorithm asked for is only run by the engines which have it
+            for algorithm in [name for name in names if name in registered] if names else registered:
+                best = None
+                for _ in range(repeat):
+                    result = measure(puzzle.board, engine, algorithm, time_limit, trace)
+                    if best is None or result['status'] == 'solved' and result['time'] < best['time']:
+                        best = result
+                    if result['status'] != 'solved':
+                        break  # a timeout does not get faster
+                best = dict(level=level, engine=engine, algorithm=algorithm, **best)
+                if log is not None:
+                    print(f"{level:<16} {engine:<10} {algorithm:<14} {best['status']:<10} {best.get('time', 0):8.3f}s",
+                          file=log, flush=True)
+                results.append(best)
+    return results
+
+
+def metadata(time_limit: Optional[float], repeat: int) -> Dict:
+    """description of the machine and of the code the benchmark ran on"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'time_limit': time_limit,
+        'repeat': repeat,
+    }
+
+
+def compare(baseline: List[Dict], current: List[Dict], threshold: float = 0.2) -> List[Tuple[str, str]]:
+    """
+    returns the regressions of current against baseline, as (run, description) pairs:
+    a solved level no longer solved, a longer solution, or more time, nodes or memory
+    than the baseline by more than threshold (a fraction)
+    """
+    def key(result):
+        return result['level'], result['engine'], result['algorithm']
+
+    previous = {key(result): result for result in baseline}
+    regressions = []
+    for result in current:
+        old = previous.get(key(result))
+        if old is None or old['status'] != 'solved':
+            continue
+        run = ' '.join(key(result))
+        if result['status'] != 'solved':
+            regressions.append((run, f"{result['status']}, was solved in {old['time']:.3f}s"))
+            continue
+        for field in ('moves', 'pushes'):
+            if result[field] > old[field]:
+                regressions.append((run, f"{field}: {old[field]} -> {result[field]}"))
+        for field in ('time', 'expanded', 'peak_rss', 'peak_traced'):
+            if field not in old or field not in result:
+                continue
+            if field == 'time' and result[field] < MIN_TIME:
+                continue
+            if result[field] > old[field] * (1 + threshold):
+                regressions.append((run, f"{field}: {old[field]:.6g} -> {result[field]:.6g}"))
+    return regressions
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the Sokoban solvers")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="run the benchmark, write the results as JSON")
+    run.add_argument('--levels', default=None, help="XSB/.sok pack (default: the bundled corpus)")
+    run.add_argument('--engine', action='append', choices=ENGINES, help="default: both")
+    run.add_argument('--algorithm', action='append', help="default: every registered algorithm")
+    run.add_argument('--time-limit', type=float, default=10, help="seconds per run")
+    run.add_argument('--repeat', type=int, default=1, help="runs per solver, the fastest one is kept")
+    run.add_argument('--tracemalloc', action='store_true', help="also record the peak traced by tracemalloc")
+    run.add_argument('--output', default='-', help="JSON file ('-' for stdout)")
+    comparison = commands.add_parser('compare', help="flag the regressions of results against a baseline")
+    comparison.add_argument('baseline')
+    comparison.add_argument('results')
+    comparison.add_argument('--threshold', type=float, default=0.2, help="tolerated increase (0.2: 20%%)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run_benchmark(
+            load_corpus(args.levels), args.engine or ENGINES, args.algorithm,
+            args.time_limit, args.repeat, args.tracemalloc, log=sys.stderr,
+        )
+        report = {'metadata': metadata(args.time_limit, args.repeat), 'results': results}
+        if args.output == '-':
+            json.dump(report, sys.stdout, indent=1)
+            print()
+        else:
+            with open(args.output, 'w') as file:
+                json.dump(report, file, indent=1)
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)['results']
+    with open(args.results) as file:
+        current = json.load(file)['results']
+    regressions = compare(baseline, current, args.threshold)
+    for run, description in regressions:
+        print(f"{run}: {description}")
+    print(f"{len(regressions)} regression(s)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,8 @@ class ErrorHelpStrings:
     """ Collection of Help texts for exceptions"""
     UNDOABLE_ACTION_HELP = "Vérifiez que les préconditions de l'action sont réunies."
     NOT_RECOGNIZED_ACTION_HELP = "Les actions valides sont: g, G, d, D, h, H, b, B."
-    NOT_RECOGNIZED_ALGORITHM_HELP = "Les algorithmes valides sont: bfs."
+    INVALID_LEVEL_HELP = "Un niveau doit contenir le personnage: p, ou q s'il est sur un but."
+    NOT_RECOGNIZED_ALGORITHM_HELP = "Les algorithmes valides sont: bfs, pushes, astar, anytime, idastar, bidirectional, hda*."
 
 
 class UndoableActionException(Exception):
@@ -21,3 +22,13 @@ class NotRecognizedActionException(Exception):
 class NotRecognizedAlgorithmException(Exception):
     """ Custom error thrown when a solving algorithm is not recognized """
     pass
+
+
+class BudgetExceededException(Exception):
+    """ Custom error thrown when a search runs out of its time, node or memory budget, or is cancelled """
+    pass
+
+
+class InvalidLevelException(ValueError):
+    """ Custom error thrown when a level cannot be loaded (no hero for instance) """
+    pass
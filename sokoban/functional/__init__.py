@@ -1 +1,46 @@
-from .sokoban import *
\ No newline at end of file
+"""
+Moteur fonctionnel du Sokoban.
+HDA* (multiprocessing), le cache des solutions (sqlite) et solving_algorithms,
+qui en dépend, ne sont importés qu'au premier accès.
+"""
+from .sokoban import *
+from .bitboard import solve_bitboard
+from .pushes import solve_pushes
+from .astar import solve_astar
+from .anytime import solve_anytime
+from .stats import SolverStats
+from .iterative import solve_idastar, TranspositionTable
+from .bidirectional import solve_bidirectional
+
+# lazy attributes: name -> module
+LAZY = {
+    'solve_hda': 'parallel',
+    'hda_speedup': 'parallel',
+    'SolutionCache': 'cache',
+    'cached': 'cache',
+}
+
+
+def __getattr__(name):
+    if name in LAZY:
+        import importlib
+        value = getattr(importlib.import_module(f".{LAZY[name]}", __name__), name)
+    elif name == 'solving_algorithms':
+        from .cache import cached
+        from .parallel import solve_hda
+        # every solver takes a State, an optional stats=SolverStats() and cache=SolutionCache(), returns a list of actions
+        value = {
+            'bfs': cached('bfs', moves=True)(solve_bfs),
+            'bitboard': cached('bitboard', moves=True)(solve_bitboard),
+            'iddfs': cached('iddfs', moves=True)(solve_iterative_deepening),
+            'pushes': cached('pushes', moves=False)(solve_pushes),
+            'astar': cached('astar', moves=False)(solve_astar),
+            'anytime': cached('anytime', moves=False)(solve_anytime),
+            'idastar': cached('idastar', moves=False)(solve_idastar),
+            'bidirectional': cached('bidirectional', moves=False)(solve_bidirectional),
+            'hda*': cached('hda*', moves=False)(solve_hda),
+        }
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
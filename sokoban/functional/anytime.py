@@ -0,0 +1,173 @@
+""" anytime weighted A* over crate pushes
+
+The search orders its frontier by g + weight * h (see astar for the heuristic):
+with a large weight it behaves like a greedy search and finds a first solution
+quickly. It does not stop there: the cost of the best solution found so far
+prunes every node whose g + h cannot beat it, the weight is lowered after each
+improvement (the frontier is reordered), and the search goes on until the
+frontier is empty, at which point the last solution is push-optimal.
+
+The search stops earlier when its time, node or memory budget is exhausted,
+or when the cancel token (a threading.Event for instance, set by another
+thread) is set; the best solution found so far is then returned. The budgets
+are checked before each node is expanded.
+"""
+import heapq
+import time
+from typing import Callable, Dict, List, Optional
+
+from ..Level import Level, UNREACHABLE
+from ..exceptions import BudgetExceededException
+from .sokoban import State, Action, NoSolutionException, actions
+from .pushes import Push, pushes, reachable, expand, symmetric_normalized, plain_normalized, build_symmetric_pushes
+from .astar import Heuristic, matching_heuristic
+from .stats import SolverStats
+from . import bitboard
+
+# estimated bytes held per stored node (cost and precedent entries, frontier tuple, integers)
+NODE_BYTES = 200
+
+# on_solution(list of pushes, stats), called with each improved solution
+OnSolution = Callable[[List[Push], SolverStats], None]
+
+
+def next_weight(weight: float) -> float:
+    """halves the distance of the weight to 1, down to 1 (plain A*)"""
+    weight = 1 + (weight - 1) / 2
+    return weight if weight >= 1.1 else 1.0
+
+
+def anytime_pushes(
+    level: Level,
+    crates: int,
+    hero: int,
+    heuristic: Heuristic = matching_heuristic,
+    stats: Optional[SolverStats] = None,
+    weight: float = 1.5,
+    time_limit: Optional[float] = None,
+    max_nodes: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+    cancel=None,
+    on_solution: Optional[OnSolution] = None,
+    symmetry=True,
+) -> Optional[List[Push]]:
+    """
+    anytime weighted A* search over pushes, returns the best list of pushes found or None if there is
+    no solution. time_limit is in seconds, memory_limit in MiB (estimated from the stored nodes, see
+    NODE_BYTES), cancel is any object with an is_set() method. When a budget runs out or the search is
+    cancelled, the best solution found so far is returned, BudgetExceededException is raised if there
+    is none yet. The returned solution is push-optimal only when the search ran to its end
+    """
+    if stats is None:
+        stats = SolverStats()
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    max_stored = None if memory_limit is None else memory_limit * 2 ** 20 // NODE_BYTES
+    limited = cancel is not None or deadline is not None or max_nodes is not None or max_stored is not None
+
+    def exhausted(stored: int) -> Optional[str]:
+        """the reason to stop the search, or None"""
+        if cancel is not None and cancel.is_set():
+            return "search cancelled"
+        if deadline is not None and time.perf_counter() >= deadline:
+            return "time budget exceeded"
+        if max_nodes is not None and stats.expanded > max_nodes:
+            return "node budget exceeded"
+        if max_stored is not None and stored > max_stored:
+            return "memory budget exceeded"
+        return None
+
+    shift = level.hero_bits + 2
+    goal_mask = level.goal_mask
+    normalize = symmetric_normalized if symmetry and len(level.symmetries) > 1 else plain_normalized
+    if crates & ~goal_mask == 0:
+        return []
+    start, start_index = normalize(level, crates, hero)
+    h = heuristic(level, crates)
+    if h >= UNREACHABLE:
+        return None
+    precedents: Dict[int, int] = {start: -1}
+    costs: Dict[int, int] = {start: 0}
+    # (g + weight * h, h, g, packed node): ties favour the nodes closest to the goals
+    frontier = [(weight * h, h, 0, start)]
+    best: Optional[List[Push]] = None
+    best_cost = UNREACHABLE
+    with stats.phase("search"):
+        while frontier:
+            _, h, g, key = heapq.heappop(frontier)
+            if g > costs[key] or g + h >= best_cost:
+                continue  # outdated entry, or it cannot improve the best solution
+            stats.expanded += 1
+            if stats.expanded >= stats.next_check:
+                stats.report()
+            if limited:
+                reason = exhausted(len(costs))
+                if reason is not None:
+                    if best is None:
+                        raise BudgetExceededException(reason)
+                    return best
+            if g > stats.depth:
+                stats.depth = g
+            crates, hero = level.unpack(key)
+            improved = False
+            for cell, direction, new_crates in pushes(level, crates, reachable(level, crates, hero), stats):
+                stats.generated += 1
+                new_key, index = normalize(level, new_crates, cell)
+                if new_key in costs and costs[new_key] <= g + 1:
+                    stats.duplicates += 1
+                    continue
+                new_h = heuristic(level, new_crates)
+                if new_h >= UNREACHABLE or g + 1 + new_h >= best_cost:
+                    stats.pruned += 1
+                    continue
+                costs[new_key] = g + 1
+                precedents[new_key] = key << shift + 3 | index << shift | cell << 2 | direction
+                if new_crates & ~goal_mask == 0:
+                    # solutions are checked when generated, so that the first one comes as early as possible
+                    best = build_symmetric_pushes(level, new_key, precedents, start_index)
+                    best_cost = g + 1
+                    improved = True
+                    if on_solution is not None:
+                        on_solution(best, stats)
+                    continue
+                heapq.heappush(frontier, (g + 1 + weight * new_h, new_h, g + 1, new_key))
+            if improved and weight > 1:
+                weight = next_weight(weight)
+                frontier = [
+                    (cost + weight * left, left, cost, node)
+                    for _, left, cost, node in frontier if cost == costs[node] and cost + left < best_cost
+                ]
+                heapq.heapify(frontier)
+            if len(frontier) > stats.frontier_peak:
+                stats.frontier_peak = len(frontier)
+    return best
+
+
+def solve_anytime(
+    state: State,
+    stats: Optional[SolverStats] = None,
+    weight: float = 1.5,
+    time_limit: Optional[float] = None,
+    max_nodes: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+    cancel=None,
+    on_solution: Optional[Callable[[List[Action], SolverStats], None]] = None,
+) -> List[Action]:
+    """
+    returns the best list of actions found within the budgets (see anytime_pushes) that solve the
+    specified state, on_solution is called with the list of actions of each improved solution
+    """
+    if stats is None:
+        stats = SolverStats()
+    bit = bitboard.from_state(state)
+
+    def on_pushes(push_list: List[Push], stats: SolverStats) -> None:
+        on_solution([actions[n] for n in expand(bit.level, bit.crates, bit.hero, push_list)], stats)
+
+    push_list = anytime_pushes(
+        bit.level, bit.crates, bit.hero, stats=stats, weight=weight, time_limit=time_limit, max_nodes=max_nodes,
+        memory_limit=memory_limit, cancel=cancel, on_solution=on_pushes if on_solution is not None else None,
+    )
+    if push_list is None:
+        raise NoSolutionException()
+    with stats.phase("expand"):
+        return [actions[n] for n in expand(bit.level, bit.crates, bit.hero, push_list)]
@@ -0,0 +1,141 @@
+""" A* search over crate pushes
+
+The heuristic is the cost of the minimum crate-to-goal assignment, computed
+with the Hungarian algorithm over the push distances precomputed by the Level.
+It never overestimates the number of pushes left, so the returned solutions
+are push-optimal.
+"""
+import heapq
+from typing import List, Optional, Dict, Callable
+
+from ..Level import Level, UNREACHABLE
+from .sokoban import State, Action, NoSolutionException, actions
+from .pushes import Push, pushes, reachable, expand, symmetric_normalized, plain_normalized, build_symmetric_pushes
+from .stats import SolverStats
+from . import bitboard
+
+Heuristic = Callable[[Level, int], int]
+
+
+def hungarian(cost: List[List[int]]) -> int:
+    """returns the cost of the minimum assignment of the rows to the columns (rows <= columns)"""
+    n, m = len(cost), len(cost[0])
+    u, v = [0] * (n + 1), [0] * (m + 1)
+    match, way = [0] * (m + 1), [0] * (m + 1)
+    for row in range(1, n + 1):
+        match[0] = row
+        column = 0
+        min_v = [float("inf")] * (m + 1)
+        used = [False] * (m + 1)
+        while match[column] != 0:
+            used[column] = True
+            current_row = match[column]
+            line = cost[current_row - 1]
+            delta, next_column = float("inf"), 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    reduced = line[j - 1] - u[current_row] - v[j]
+                    if reduced < min_v[j]:
+                        min_v[j], way[j] = reduced, column
+                    if min_v[j] < delta:
+                        delta, next_column = min_v[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+            column = next_column
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+    return -v[0]
+
+
+def matching_heuristic(level: Level, crates: int) -> int:
+    """
+    minimum number of pushes left: cost of the best crate-to-goal assignment.
+    returns UNREACHABLE or more when a crate cannot reach any goal
+    """
+    cells = []
+    while crates:
+        low = crates & -crates
+        cells.append(low.bit_length() - 1)
+        crates ^= low
+    if not cells:
+        return 0
+    if len(cells) > len(level.goal_distances):
+        return UNREACHABLE
+    cost = [[distances[cell] for distances in level.goal_distances] for cell in cells]
+    return hungarian(cost)
+
+
+def astar_pushes(
+    level: Level,
+    crates: int,
+    hero: int,
+    heuristic: Heuristic = matching_heuristic,
+    stats: Optional[SolverStats] = None,
+    symmetry=True,
+) -> Optional[List[Push]]:
+    """
+    A* search over pushes with a binary heap frontier, returns a list of pushes or None.
+    the frontier holds (g + h, h, packed node) so that ties favour the deepest nodes.
+    with symmetry, the nodes which are images of each other by a symmetry of the level are merged
+    (the heuristic must be invariant by these symmetries, as the push distances are)
+    """
+    if stats is None:
+        stats = SolverStats()
+    shift = level.hero_bits + 2
+    goal_mask = level.goal_mask
+    normalize = symmetric_normalized if symmetry and len(level.symmetries) > 1 else plain_normalized
+    start, start_index = normalize(level, crates, hero)
+    h = heuristic(level, crates)
+    if h >= UNREACHABLE:
+        return None
+    precedents: Dict[int, int] = {start: -1}
+    costs: Dict[int, int] = {start: 0}
+    frontier = [(h, h, start)]
+    with stats.phase("search"):
+        while frontier:
+            f, h, key = heapq.heappop(frontier)
+            g = f - h
+            if g > costs[key]:
+                continue  # outdated entry
+            stats.expanded += 1
+            if stats.expanded >= stats.next_check:
+                stats.report()
+            if g > stats.depth:
+                stats.depth = g
+            crates, hero = level.unpack(key)
+            if crates & ~goal_mask == 0:
+                return build_symmetric_pushes(level, key, precedents, start_index)
+            for cell, direction, new_crates in pushes(level, crates, reachable(level, crates, hero), stats):
+                stats.generated += 1
+                new_key, index = normalize(level, new_crates, cell)
+                if new_key in costs and costs[new_key] <= g + 1:
+                    stats.duplicates += 1
+                    continue
+                new_h = heuristic(level, new_crates)
+                if new_h >= UNREACHABLE:
+                    stats.pruned += 1
+                    continue
+                costs[new_key] = g + 1
+                precedents[new_key] = key << shift + 3 | index << shift | cell << 2 | direction
+                heapq.heappush(frontier, (g + 1 + new_h, new_h, new_key))
+            if len(frontier) > stats.frontier_peak:
+                stats.frontier_peak = len(frontier)
+    return None
+
+
+def solve_astar(state: State, stats: Optional[SolverStats] = None) -> List[Action]:
+    """returns a push-optimal list of actions that solve the specified state"""
+    if stats is None:
+        stats = SolverStats()
+    bit = bitboard.from_state(state)
+    push_list = astar_pushes(bit.level, bit.crates, bit.hero, stats=stats)
+    if push_list is None:
+        raise NoSolutionException()
+    with stats.phase("expand"):
+        return [actions[n] for n in expand(bit.level, bit.crates, bit.hero, push_list)]
@@ -0,0 +1,188 @@
+""" bidirectional search over crate pushes
+
+A forward push-level search from the start and a backward pull-level search
+from the solved configurations (crates on every goal, hero in every region
+next to the crates) grow one layer at a time, on the side which expanded the
+fewest nodes so far. Both use the same normalized packed nodes, so a node
+generated by one side and already known by the other is a meeting point; the
+backward side records the forward push of each pull, so the two half paths
+join into a single list of pushes.
+
+The forward side prunes its pushes with the dead squares and the deadlock
+detection. The backward side mirrors them with the start crates in place of
+the goals: a crate is never pulled on a cell that no start crate can be
+pushed to (the reverse dead squares), and a configuration is dropped when its
+crates cannot be matched to distinct start cells they can each come from
+(see start_matching), the pull counterpart of the matching heuristic.
+"""
+from collections import deque
+from typing import Iterator, List, Optional, Tuple, Dict
+
+from ..Level import Level, UNREACHABLE
+from .sokoban import State, Action, NoSolutionException, actions
+from .pushes import Push, pushes, reachable, canonical, normalized, expand, build_pushes, bfs_pushes
+from .astar import hungarian
+from .stats import SolverStats
+from . import bitboard
+
+
+def pulls(level: Level, crates: int, reach: int) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    yields (new crate cell, forward push direction, new crates, new hero cell) for every pull
+    the hero can reach: the hero stands next to a crate, steps back and drags the crate along
+    """
+    neighbours = level.neighbours
+    remaining = crates
+    while remaining:
+        low = remaining & -remaining
+        remaining ^= low
+        cell = low.bit_length() - 1
+        for direction in range(4):
+            hero = neighbours[cell][direction]
+            if hero < 0 or not reach >> hero & 1:
+                continue
+            back = neighbours[hero][direction]
+            if back >= 0 and not crates >> back & 1:
+                yield hero, direction ^ 1, crates ^ low ^ (1 << hero), back
+
+
+def push_distances(level: Level, start: int) -> Tuple[int, ...]:
+    """
+    returns, for every cell, the minimum number of pushes needed to bring a crate from the start
+    cell to that cell on an empty level (the forward counterpart of Level.pull_distances)
+    """
+    neighbours = level.neighbours
+    distances = [UNREACHABLE] * len(level.cells)
+    distances[start] = 0
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        for direction in range(4):
+            target = neighbours[cell][direction]
+            if target >= 0 and distances[target] == UNREACHABLE and neighbours[cell][direction ^ 1] >= 0:
+                distances[target] = distances[cell] + 1
+                queue.append(target)
+    return tuple(distances)
+
+
+def start_matching(start_distances: List[Tuple[int, ...]], crates: int) -> int:
+    """
+    cost of the best assignment of the crates to the start cells (start_distances[start][cell]):
+    UNREACHABLE or more when the start configuration cannot be pulled back to
+    """
+    cells = []
+    while crates:
+        low = crates & -crates
+        cells.append(low.bit_length() - 1)
+        crates ^= low
+    return hungarian([[distances[cell] for distances in start_distances] for cell in cells])
+
+
+def goal_nodes(level: Level) -> List[int]:
+    """returns the packed solved nodes: crates on every goal, hero in each region next to a crate"""
+    crates = level.goal_mask
+    seen = crates
+    nodes = []
+    for cell in range(len(level.cells)):
+        if seen >> cell & 1:
+            continue
+        reach = reachable(level, crates, cell)
+        seen |= reach
+        if next(pulls(level, crates, reach), None) is not None:
+            nodes.append(level.pack(crates, canonical(reach)))
+    return nodes
+
+
+def bidirectional_pushes(level: Level, crates: int, hero: int, stats: Optional[SolverStats] = None) -> Optional[List[Push]]:
+    """
+    bidirectional breadth-first search over pushes and pulls, returns a list of pushes or None.
+    both precedents dicts map a packed node to (packed parent << shift | crate cell << 2 | push direction)
+    """
+    if stats is None:
+        stats = SolverStats()
+    crate_count, goal_count = bin(crates).count("1"), len(level.goal_cells)
+    if crate_count > goal_count:
+        return None
+    if crate_count < goal_count:
+        # the solved configurations are not known in advance, search forward only
+        return bfs_pushes(level, crates, hero, stats=stats)
+    if crates & ~level.goal_mask == 0:
+        return []
+    shift = level.hero_bits + 2
+    start = normalized(level, crates, hero)
+    forward: Dict[int, int] = {start: -1}
+    with stats.phase("setup"):
+        backward: Dict[int, int] = {node: -1 for node in goal_nodes(level)}
+        start_distances = []
+        remaining = crates
+        while remaining:
+            low = remaining & -remaining
+            remaining ^= low
+            start_distances.append(push_distances(level, low.bit_length() - 1))
+        # cells some start crate can be pushed to, the others are dead for the pulls
+        live_mask = 0
+        for cell in range(len(level.cells)):
+            if any(distances[cell] < UNREACHABLE for distances in start_distances):
+                live_mask |= 1 << cell
+    forward_queue, backward_queue = deque([start]), deque(backward)
+    forward_expanded = backward_expanded = 0
+    with stats.phase("search"):
+        while forward_queue and backward_queue:
+            if forward_expanded <= backward_expanded:
+                forward_expanded += len(forward_queue)
+                for _ in range(len(forward_queue)):
+                    key = forward_queue.popleft()
+                    stats.expanded += 1
+                    if stats.expanded >= stats.next_check:
+                        stats.report()
+                    crates, hero = level.unpack(key)
+                    for cell, direction, new_crates in pushes(level, crates, reachable(level, crates, hero), stats):
+                        stats.generated += 1
+                        new_key = normalized(level, new_crates, cell)
+                        if new_key in forward:
+                            stats.duplicates += 1
+                            continue
+                        forward[new_key] = key << shift | cell << 2 | direction
+                        if new_key in backward:
+                            return build_pushes(level, new_key, forward) + build_pushes(level, new_key, backward)[::-1]
+                        forward_queue.append(new_key)
+            else:
+                backward_expanded += len(backward_queue)
+                for _ in range(len(backward_queue)):
+                    key = backward_queue.popleft()
+                    stats.expanded += 1
+                    if stats.expanded >= stats.next_check:
+                        stats.report()
+                    crates, hero = level.unpack(key)
+                    for cell, direction, new_crates, new_hero in pulls(level, crates, reachable(level, crates, hero)):
+                        stats.generated += 1
+                        if not live_mask >> cell & 1:
+                            stats.pruned += 1
+                            continue
+                        new_key = normalized(level, new_crates, new_hero)
+                        if new_key in backward:
+                            stats.duplicates += 1
+                            continue
+                        if start_matching(start_distances, new_crates) >= UNREACHABLE:
+                            stats.pruned += 1
+                            continue
+                        backward[new_key] = key << shift | cell << 2 | direction
+                        if new_key in forward:
+                            return build_pushes(level, new_key, forward) + build_pushes(level, new_key, backward)[::-1]
+                        backward_queue.append(new_key)
+            # one more layer on one side, depth is the sum of the depths of both sides
+            stats.depth += 1
+            stats.frontier_peak = max(stats.frontier_peak, len(forward_queue) + len(backward_queue))
+    return None
+
+
+def solve_bidirectional(state: State, stats: Optional[SolverStats] = None) -> List[Action]:
+    """returns a list of actions that solve the specified state, using a bidirectional push/pull search"""
+    if stats is None:
+        stats = SolverStats()
+    bit = bitboard.from_state(state)
+    push_list = bidirectional_pushes(bit.level, bit.crates, bit.hero, stats)
+    if push_list is None:
+        raise NoSolutionException()
+    with stats.phase("expand"):
+        return [actions[n] for n in expand(bit.level, bit.crates, bit.hero, push_list)]
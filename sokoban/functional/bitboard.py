@@ -0,0 +1,178 @@
+""" compact, bitboard-backed version of the functional Sokoban solver
+
+Crates are stored as an int bitmask over the floor cells of a shared Level and
+the hero as the index of its cell. Search nodes are packed in a single int
+(see Level.pack), which keeps the visited dict small on large levels.
+"""
+from collections import deque
+from typing import NamedTuple, Dict, List, Optional, Mapping, MutableMapping
+
+from ..Level import Level
+from . import sokoban as f
+from .sokoban import Action, PreconditionUnmetException, NoSolutionException
+from .deadlocks import is_deadlock, mask_predicate
+from .stats import SolverStats, print_progress
+from .visited import VisitedStore
+
+BitState = NamedTuple(
+    "BitState",
+    [
+        ("level", Level),
+        ("crates", int),
+        ("hero", int),
+    ],
+)
+
+
+def action_index(action: Action) -> int:
+    """returns the index of an action in sokoban.actions (direction = index % 4, push = index >= 4)"""
+    try:
+        return f.action_ids[id(action)]
+    except KeyError:
+        raise ValueError("unknown action")
+
+
+def from_state(state: f.State) -> BitState:
+    """converts a sokoban.State in a BitState"""
+    level = state.level
+    return BitState(level, level.mask(state.crates), level.index[state.hero])
+
+
+def to_state(state: BitState) -> f.State:
+    """converts a BitState in a sokoban.State"""
+    level = state.level
+    crates = level.positions(state.crates)
+    hero = level.cells[state.hero]
+    return f.State(level, frozenset(crates), hero, level.zobrist(crates, hero))
+
+
+def load_from_string(state_string: str) -> BitState:
+    """Charge un état à partir d'une chaîne de caractères"""
+    return from_state(f.load_from_string(state_string))
+
+
+def save_to_string(state: BitState) -> str:
+    """Sauvegarde un état sous forme d'une chaîne de caractères"""
+    return f.save_to_string(to_state(state))
+
+
+def is_win(state: BitState) -> bool:
+    """Returns True if all crates are on a goal, False otherwise"""
+    return state.crates & ~state.level.goal_mask == 0
+
+
+def step(level: Level, crates: int, hero: int, n: int):
+    """
+    applies the n-th action of sokoban.actions to the (crates, hero) pair,
+    returns the new pair or None if the action is not possible
+    """
+    direction = n & 3
+    target = level.neighbours[hero][direction]
+    if target < 0:
+        return None
+    if n < 4:
+        if crates >> target & 1:
+            return None
+        return crates, target
+    if not crates >> target & 1:
+        return None
+    beyond = level.neighbours[target][direction]
+    if beyond < 0 or crates >> beyond & 1:
+        return None
+    return crates ^ (1 << target) ^ (1 << beyond), target
+
+
+def execute(state: BitState, action: Action) -> BitState:
+    """returns a new state onto which the specified action has been executed"""
+    result = step(state.level, state.crates, state.hero, action_index(action))
+    if result is None:
+        raise PreconditionUnmetException(f"{action_index(action)}-th action impossible at cell {state.hero}")
+    return BitState(state.level, *result)
+
+
+def build_path(level: Level, initial_key: int, key: int, precedents: Mapping[int, int]) -> List[Action]:
+    """Builds a path from the packed current state to the packed initial state"""
+    path = []
+    while key != initial_key:
+        value = precedents[key]
+        path.append(f.actions[value & 7])
+        key = value >> 3
+    return path[::-1]
+
+
+def solve_bfs(
+    state: BitState, max_depth=0, debug=False, stats: Optional[SolverStats] = None, budget=0
+) -> List[Action]:
+    """
+    returns a list of actions that solve the specified state.
+    precedents maps each packed state to (packed parent << 3 | action index),
+    past budget entries (0: no limit) they are spilled to disk (see visited.VisitedStore)
+    """
+    if stats is None:
+        stats = SolverStats()
+    level = state.level
+    goal_mask, dead_mask = level.goal_mask, level.dead_mask
+    initial_key = level.pack(state.crates, state.hero)
+    precedents: MutableMapping[int, int] = VisitedStore.for_level(level, 3, budget) if budget else {}
+    precedents[initial_key] = -1
+    queue = deque([initial_key])
+    depth, layer_end = 0, 1  # number of keys left in the current layer
+    if debug:
+        print("[i] Start of Breadth-First Search")
+        stats.progress = stats.progress or print_progress
+    with stats.phase("search"):
+        while queue and (max_depth == 0 or depth < max_depth):
+            key = queue.popleft()
+            stats.expanded += 1
+            if stats.expanded >= stats.next_check:
+                stats.report()
+            crates, hero = level.unpack(key)
+            if crates & ~goal_mask == 0:
+                break
+            for n in range(8):
+                result = step(level, crates, hero, n)
+                if result is None:
+                    continue
+                stats.generated += 1
+                if n >= 4:
+                    crate = level.neighbours[result[1]][n & 3]
+                    if dead_mask >> crate & 1 or is_deadlock(level, mask_predicate(result[0]), crate):
+                        stats.pruned += 1
+                        continue
+                new_key = level.pack(*result)
+                if new_key in precedents:
+                    stats.duplicates += 1
+                    continue
+                precedents[new_key] = key << 3 | n
+                queue.append(new_key)
+            if len(queue) > stats.frontier_peak:
+                stats.frontier_peak = len(queue)
+            layer_end -= 1
+            if layer_end == 0:
+                depth += 1
+                stats.depth = depth
+                layer_end = len(queue)
+        else:
+            raise NoSolutionException()
+    with stats.phase("path"):
+        return build_path(level, initial_key, key, precedents)
+
+
+def bfs_moves(
+    level: Level, crates: int, hero: int, max_depth=0, stats: Optional[SolverStats] = None, budget=0
+) -> Optional[List[int]]:
+    """breadth-first search from a (crates bitmask, hero cell) pair, returns a move-optimal list of action indices or None"""
+    try:
+        return [
+            action_index(action)
+            for action in solve_bfs(BitState(level, crates, hero), max_depth, stats=stats, budget=budget)
+        ]
+    except NoSolutionException:
+        return None
+
+
+def solve_bitboard(
+    state: f.State, max_depth=0, debug=False, stats: Optional[SolverStats] = None, budget=0
+) -> List[Action]:
+    """returns a list of actions that solve the specified sokoban.State, using the bitboard breadth-first search"""
+    return solve_bfs(from_state(state), max_depth, debug, stats, budget)
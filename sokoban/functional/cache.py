@@ -0,0 +1,186 @@
+""" persistent cache of the solutions, shared by the runs and the processes
+
+Solutions are stored in a sqlite database, keyed by the algorithm and a
+fingerprint of the position: a hash of its walls, goals, crates and hero.
+For the push-level algorithms the hero is normalized to the first cell of its
+region (see pushes.canonical), so every position which only differs by where
+the hero stands in the same region shares a single entry, whose walking
+segments are rebuilt for the real hero cell; the move-level algorithms keep
+the exact hero cell. On a symmetric level (see Level.symmetries) the images
+of a position by the symmetries share the entry of the one with the smallest
+fingerprint, the solutions are mapped through the symmetry both ways. Entries
+beyond max_entries are evicted, least recently used first.
+"""
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Callable, List, Optional, Tuple
+
+from ..Level import Level, Symmetry
+from .sokoban import State, action_letters, actions
+from .pushes import reachable, canonical, expand, extract_pushes, transform, inverse
+from .stats import SolverStats
+from . import bitboard
+
+# default location of the cache, overridden by the SOKOBAN_CACHE environment variable
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sokoban", "solutions.sqlite")
+
+
+def fingerprint(level: Level, crates: int, hero: int) -> str:
+    """hash of a position: its board in the project alphabet, without trailing spaces"""
+    hero_pos = level.cells[hero]
+    crate_cells = set(level.positions(crates))
+    w, h = level.map_size
+    rows = []
+    for y in range(h):
+        row = ""
+        for x in range(w):
+            pos = (x, y)
+            if pos not in level.index:
+                row += "%"
+            elif pos in crate_cells:
+                row += "v" if pos in level.goals else "c"
+            elif pos == hero_pos:
+                row += "q" if pos in level.goals else "p"
+            else:
+                row += "b" if pos in level.goals else " "
+        rows.append(row.rstrip())
+    return hashlib.sha256("\n".join(rows).strip("\n").encode()).hexdigest()
+
+
+def translate(
+    level: Level, symmetry: Symmetry, crates: int, hero: int, indices: List[int], start_hero: int, moves: bool
+) -> List[int]:
+    """
+    maps the action indices of a solution played from (crates, hero) through a symmetry of the level,
+    the image is played from start_hero (the hero cell itself for the move-level solutions)
+    """
+    if moves:
+        return [n & 4 | symmetry.directions[n & 3] for n in indices]
+    push_list = [
+        (symmetry.cells[cell], symmetry.directions[direction])
+        for cell, direction in extract_pushes(level, hero, indices)
+    ]
+    return expand(level, transform(symmetry, crates), start_hero, push_list)
+
+
+class SolutionCache:
+    """
+    sqlite-backed cache of solutions (hdgbHDGB strings) and of the statistics of the searches which found them
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 100_000) -> None:
+        self.path = path or os.environ.get("SOKOBAN_CACHE") or DEFAULT_PATH
+        self.max_entries = max_entries
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS solutions ("
+            "key TEXT PRIMARY KEY, solution TEXT NOT NULL, stats TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS solutions_last_used ON solutions (last_used)")
+        self.connection.commit()
+
+    @staticmethod
+    def key(level: Level, crates: int, hero: int, algorithm: str, moves: bool) -> Tuple[str, int, Symmetry]:
+        """
+        returns the key of a position solved by an algorithm, the hero cell its solution starts from,
+        and the symmetry of the level which maps the position onto the stored one
+        """
+        reach = None if moves else reachable(level, crates, hero)
+        best = None
+        for symmetry in level.symmetries:
+            start_hero = symmetry.cells[hero] if moves else canonical(transform(symmetry, reach))
+            board = fingerprint(level, transform(symmetry, crates), start_hero)
+            if best is None or board < best[0]:
+                best = board, start_hero, symmetry
+        board, start_hero, symmetry = best
+        return f"{algorithm}:{board}", start_hero, symmetry
+
+    def get(
+        self, level: Level, crates: int, hero: int, algorithm: str, moves: bool,
+        stats: Optional[SolverStats] = None,
+    ) -> Optional[List[int]]:
+        """
+        returns the action indices of the cached solution of the position, played from hero, or None.
+        stats receives the statistics of the search which found the solution
+        """
+        start = time.perf_counter()
+        key, start_hero, symmetry = self.key(level, crates, hero, algorithm, moves)
+        row = self.connection.execute("SELECT solution, stats FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute("UPDATE solutions SET last_used = ? WHERE key = ?", (time.time(), key))
+        indices = [action_letters.index(letter) for letter in row[0]]
+        if start_hero != hero or symmetry is not level.symmetries[0]:
+            indices = translate(
+                level, inverse(symmetry), transform(symmetry, crates), start_hero, indices, hero, moves
+            )
+        if stats is not None:
+            for name, value in json.loads(row[1]).items():
+                if name != "phases":
+                    setattr(stats, name, value)
+            stats.phases["cache"] = time.perf_counter() - start
+        return indices
+
+    def put(
+        self, level: Level, crates: int, hero: int, algorithm: str, moves: bool,
+        indices: List[int], stats: Optional[SolverStats] = None,
+    ) -> None:
+        """stores the solution (action indices played from hero) of a position, evicts the least recently used"""
+        key, start_hero, symmetry = self.key(level, crates, hero, algorithm, moves)
+        if start_hero != hero or symmetry is not level.symmetries[0]:
+            indices = translate(level, symmetry, crates, hero, indices, start_hero, moves)
+        solution = "".join(action_letters[n] for n in indices)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?)",
+                (key, solution, json.dumps(stats.as_dict() if stats is not None else {}), time.time()),
+            )
+            self.connection.execute(
+                "DELETE FROM solutions WHERE key IN "
+                "(SELECT key FROM solutions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM solutions")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+
+def cached(algorithm: str, moves: bool) -> Callable:
+    """
+    decorator of a functional solver solve(state, ..., stats=None) -> list of actions,
+    which adds a cache=SolutionCache() argument, checked before searching
+    """
+    def decorator(solve: Callable) -> Callable:
+        @functools.wraps(solve)
+        def wrapper(state: State, *args, cache: Optional[SolutionCache] = None, stats: Optional[SolverStats] = None,
+                    **kwargs):
+            if cache is None:
+                return solve(state, *args, stats=stats, **kwargs)
+            if stats is None:
+                stats = SolverStats()
+            bit = bitboard.from_state(state)
+            indices = cache.get(bit.level, bit.crates, bit.hero, algorithm, moves, stats)
+            if indices is not None:
+                return [actions[n] for n in indices]
+            solution = solve(state, *args, stats=stats, **kwargs)
+            indices = [bitboard.action_index(action) for action in solution]
+            cache.put(bit.level, bit.crates, bit.hero, algorithm, moves, indices, stats)
+            return solution
+        return wrapper
+    return decorator
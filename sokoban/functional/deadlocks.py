@@ -0,0 +1,70 @@
+""" dynamic deadlock detection
+
+Checks run after a push and only look at the neighbourhood of the crate
+that just moved:
+- 2x2 blocks made of walls and crates, with a crate off goal;
+- frozen crates: a crate blocked on both axes (by walls, by two dead squares
+  or by other frozen crates), with a frozen crate off goal.
+Crates are given as a predicate on cell indices so that every state encoding
+can use the same detector.
+"""
+from typing import Callable, List, Tuple
+
+from ..Level import Level
+
+CratePredicate = Callable[[int], bool]
+
+
+def block_deadlock(level: Level, crate: CratePredicate, cell: int) -> bool:
+    """returns True if the crate at cell is part of a 2x2 block of walls and crates with a crate off goal"""
+    goal_mask = level.goal_mask
+    for square in level.squares[cell]:
+        off_goal = not goal_mask >> cell & 1
+        for other in square:
+            if other >= 0:
+                if not crate(other):
+                    break
+                off_goal = off_goal or not goal_mask >> other & 1
+        else:
+            if off_goal:
+                return True
+    return False
+
+
+def blocked(level: Level, crate: CratePredicate, cell: int, axis: int, walls: Tuple[int, ...], chain: List[int]) -> bool:
+    """
+    returns True if the crate at cell cannot move along the axis (0: horizontal, 1: vertical),
+    the cells of walls being considered as walls. frozen neighbour crates are appended to chain
+    """
+    around = level.neighbours[cell]
+    first, second = around[2 * axis], around[2 * axis + 1]
+    if first < 0 or second < 0 or first in walls or second in walls:
+        return True
+    dead_mask = level.dead_mask
+    if dead_mask >> first & 1 and dead_mask >> second & 1:
+        return True
+    walls = walls + (cell,)
+    for side in (first, second):
+        if crate(side) and blocked(level, crate, side, 1 - axis, walls, chain):
+            chain.append(side)
+            return True
+    return False
+
+
+def freeze_deadlock(level: Level, crate: CratePredicate, cell: int) -> bool:
+    """returns True if the crate at cell is frozen along with at least one frozen crate off goal"""
+    chain = [cell]
+    if not (blocked(level, crate, cell, 0, (), chain) and blocked(level, crate, cell, 1, (), chain)):
+        return False
+    goal_mask = level.goal_mask
+    return any(not goal_mask >> frozen & 1 for frozen in chain)
+
+
+def is_deadlock(level: Level, crate: CratePredicate, cell: int) -> bool:
+    """returns True if pushing a crate on cell made the level unsolvable"""
+    return block_deadlock(level, crate, cell) or freeze_deadlock(level, crate, cell)
+
+
+def mask_predicate(crates: int) -> CratePredicate:
+    """crate predicate of a bitmask of crates"""
+    return lambda cell: crates >> cell & 1 == 1
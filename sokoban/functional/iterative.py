@@ -0,0 +1,165 @@
+""" memory-bounded IDA* over crate pushes
+
+The search is a depth-first search bounded by g + h, restarted with the
+smallest f value that exceeded the bound. Only the current path is kept in
+memory (a stack of successor generators), plus an optional fixed-size
+transposition table.
+"""
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Set
+
+from ..Level import Level, UNREACHABLE
+from .sokoban import State, Action, NoSolutionException, actions
+from .pushes import Push, pushes, reachable, normalized, expand
+from .astar import Heuristic, matching_heuristic
+from .stats import SolverStats
+from . import bitboard
+
+
+class TranspositionTable:
+    """
+    Bounded table of the nodes visited during an iteration of IDA*, with the smallest
+    depth at which they were reached.
+    replacement is 'lru' (evict the least recently used node) or 'depth'
+    (one slot per hash bucket, a shallower node replaces a deeper one).
+    """
+
+    def __init__(self, size: int, replacement: str = "lru") -> None:
+        if replacement not in ("lru", "depth"):
+            raise ValueError(f"unknown replacement scheme: {replacement}")
+        self.size = size
+        self.replacement = replacement
+        self.entries: "OrderedDict[int, Tuple[int, int]]" = OrderedDict()
+        self.slots: List[Optional[Tuple[int, int, int]]] = [None] * size if replacement == "depth" else []
+
+    def visit(self, key: int, depth: int, iteration: int) -> bool:
+        """
+        records a node reached at depth, returns False if it was already reached during
+        the same iteration at a depth lower or equal (its subtree need not be searched again)
+        """
+        if self.replacement == "lru":
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                if entry[0] == iteration and entry[1] <= depth:
+                    return False
+            elif len(self.entries) >= self.size:
+                self.entries.popitem(last=False)
+            self.entries[key] = (iteration, depth)
+            return True
+        slot = key % self.size
+        entry = self.slots[slot]
+        if entry is not None and entry[1] == iteration:
+            if entry[0] == key and entry[2] <= depth:
+                return False
+            if entry[0] != key and entry[2] < depth:
+                return True  # keep the shallower node
+        self.slots[slot] = (key, iteration, depth)
+        return True
+
+
+def bounded_search(
+    level: Level,
+    start: int,
+    bound: int,
+    heuristic: Heuristic,
+    table: Optional[TranspositionTable],
+    iteration: int,
+    stats: SolverStats,
+) -> Tuple[Optional[List[Push]], int]:
+    """
+    depth-first search of the nodes with g + h <= bound,
+    returns (list of pushes, bound) on success, (None, smallest f above the bound) otherwise
+    """
+    goal_mask = level.goal_mask
+    path = [start]
+    on_path: Set[int] = {start}
+    moves: List[Push] = []
+    crates, hero = level.unpack(start)
+    stack = [pushes(level, crates, reachable(level, crates, hero), stats)]
+    next_bound = UNREACHABLE
+    stats.expanded += 1
+    while stack:
+        g = len(path)
+        for cell, direction, new_crates in stack[-1]:
+            stats.generated += 1
+            new_key = normalized(level, new_crates, cell)
+            if new_key in on_path:
+                stats.duplicates += 1
+                continue
+            h = heuristic(level, new_crates)
+            if h >= UNREACHABLE:
+                stats.pruned += 1
+                continue
+            if g + h > bound:
+                next_bound = min(next_bound, g + h)
+                continue
+            if table is not None and not table.visit(new_key, g, iteration):
+                stats.duplicates += 1
+                continue
+            moves.append((cell, direction))
+            if new_crates & ~goal_mask == 0:
+                return moves, bound
+            path.append(new_key)
+            on_path.add(new_key)
+            hero = level.unpack(new_key)[1]
+            stack.append(pushes(level, new_crates, reachable(level, new_crates, hero), stats))
+            stats.expanded += 1
+            if stats.expanded >= stats.next_check:
+                stats.report()
+            if g > stats.depth:
+                stats.depth = stats.frontier_peak = g
+            break
+        else:
+            stack.pop()
+            on_path.discard(path.pop())
+            if moves:
+                moves.pop()
+    return None, next_bound
+
+
+def ida_star_pushes(
+    level: Level,
+    crates: int,
+    hero: int,
+    heuristic: Heuristic = matching_heuristic,
+    table: Optional[TranspositionTable] = None,
+    stats: Optional[SolverStats] = None,
+) -> Optional[List[Push]]:
+    """IDA* search over pushes, returns a push-optimal list of pushes or None"""
+    if stats is None:
+        stats = SolverStats()
+    if crates & ~level.goal_mask == 0:
+        return []
+    bound = heuristic(level, crates)
+    start = normalized(level, crates, hero)
+    iteration = 0
+    with stats.phase("search"):
+        while bound < UNREACHABLE:
+            iteration += 1
+            push_list, bound = bounded_search(level, start, bound, heuristic, table, iteration, stats)
+            if push_list is not None:
+                return push_list
+    return None
+
+
+def solve_idastar(
+    state: State,
+    heuristic: Heuristic = matching_heuristic,
+    table_size=0,
+    replacement="lru",
+    stats: Optional[SolverStats] = None,
+) -> List[Action]:
+    """
+    returns a push-optimal list of actions that solve the specified state, using IDA*.
+    table_size bounds the number of entries of the transposition table (0: no table)
+    """
+    if stats is None:
+        stats = SolverStats()
+    bit = bitboard.from_state(state)
+    table = TranspositionTable(table_size, replacement) if table_size else None
+    push_list = ida_star_pushes(bit.level, bit.crates, bit.hero, heuristic, table, stats)
+    if push_list is None:
+        raise NoSolutionException()
+    with stats.phase("expand"):
+        return [actions[n] for n in expand(bit.level, bit.crates, bit.hero, push_list)]
@@ -0,0 +1,306 @@
+""" hash-distributed A* (HDA*) over crate pushes, on a pool of processes
+
+Every node is owned by the worker process selected by its Zobrist hash. A
+worker expands the best nodes of its own open list and sends each successor
+to its owner, in batches, through the owner's inbox queue. A goal node
+reached with g pushes becomes the shared incumbent; a worker whose open list
+only holds nodes with f >= incumbent is idle. The search stops when every
+worker is idle and every batch sent has been received, checked twice in a
+row on the shared counters, so no node that could improve the incumbent is
+left anywhere: the solution is push-optimal as with the single-core A*.
+The path is then rebuilt by asking the owner of each node for its parent.
+
+Nothing polls: an idle worker blocks on its inbox, and tells the coordinator
+when it becomes idle, which is the only time the termination condition can
+become true; the coordinator blocks on these messages and checks the counters
+then. Still, every node sent to another worker is pickled through a queue:
+HDA* only beats the single-core A* with one CPU per worker and levels large
+enough for the expansions to outweigh the messages. With a single worker (the
+default on a single CPU), the single-core A* is run instead.
+A worker that dies (killed, or on an exception) makes the search raise
+RuntimeError instead of waiting for it.
+"""
+import heapq
+import multiprocessing as mp
+import os
+import queue
+import time
+from typing import List, Optional, Tuple, Dict
+
+from ..Level import Level, UNREACHABLE
+from .sokoban import State, Action, NoSolutionException, actions
+from .pushes import Push, pushes, reachable, normalized, expand
+from .astar import Heuristic, matching_heuristic, astar_pushes
+from .stats import SolverStats
+from . import bitboard
+
+# number of expansions between two flushes of the outgoing batches: the longer the nodes wait in an outbox,
+# the further from the best f the other workers expand (with 3 workers, 64 expands about 1.5 times more nodes)
+BATCH_SIZE = 8
+# seconds between two checks of the workers (exited?) while waiting for their messages
+POLL_INTERVAL = 0.1
+# seconds an idle worker waits on its inbox before waiting again, it has nothing to do until a message comes
+IDLE_TIMEOUT = 1.0
+
+
+def node_hash(level: Level, key: int) -> int:
+    """Zobrist hash of a packed node"""
+    crates, hero = level.unpack(key)
+    cells = level.cells
+    h = level.hero_keys[cells[hero]]
+    while crates:
+        low = crates & -crates
+        h ^= level.crate_keys[cells[low.bit_length() - 1]]
+        crates ^= low
+    return h
+
+
+def check_workers(processes: List[mp.Process]) -> None:
+    """raises RuntimeError if a worker process has exited"""
+    for n, process in enumerate(processes):
+        if process.exitcode is not None:
+            raise RuntimeError(f"HDA* worker {n} exited with code {process.exitcode}")
+
+
+def receive(results: "mp.Queue", processes: List[mp.Process]) -> tuple:
+    """returns the next message of the workers, raises RuntimeError if a worker is gone before it comes"""
+    while True:
+        try:
+            return results.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            check_workers(processes)
+
+
+def worker(index, level, heuristic, inboxes, results, sent, received, idle, expanded, incumbent) -> None:
+    """main loop of a worker process"""
+    workers = len(inboxes)
+    inbox = inboxes[index]
+    goal_mask = level.goal_mask
+    stats = SolverStats()
+    frontier: List[Tuple[int, int, int, int]] = []  # (f, h, g, key)
+    closed: Dict[int, Tuple[int, int, int]] = {}  # key -> (g, parent key, crate cell << 2 | direction)
+    outbox: List[list] = [[] for _ in range(workers)]
+
+    def add(g, key, parent, push) -> None:
+        known = closed.get(key)
+        if known is not None and known[0] <= g:
+            stats.duplicates += 1
+            return
+        h = heuristic(level, level.unpack(key)[0])
+        if h >= UNREACHABLE:
+            stats.pruned += 1
+            return
+        closed[key] = (g, parent, push)
+        heapq.heappush(frontier, (g + h, h, g, key))
+
+    while True:
+        blocking = not frontier or frontier[0][0] >= incumbent.value
+        if blocking and not idle[index]:
+            idle[index] = 1
+            results.put(("idle", index))  # wakes the coordinator up to check the termination
+        try:
+            message = inbox.get(timeout=IDLE_TIMEOUT) if blocking else inbox.get_nowait()
+        except queue.Empty:
+            message = None
+        while message is not None:
+            kind = message[0]
+            if kind == "nodes":
+                idle[index] = 0
+                received[index] += 1
+                for g, key, parent, push in message[1]:
+                    add(g, key, parent, push)
+            elif kind == "parent":
+                _, parent, push = closed[message[1]]
+                results.put(("parent", message[1], parent, push))
+            elif kind == "stop":
+                results.put(("stats", stats))
+                return
+            try:
+                message = inbox.get_nowait()
+            except queue.Empty:
+                message = None
+
+        for _ in range(BATCH_SIZE):
+            if not frontier or frontier[0][0] >= incumbent.value:
+                break
+            f, h, g, key = heapq.heappop(frontier)
+            if g > closed[key][0]:
+                continue  # outdated entry
+            stats.expanded += 1
+            if g > stats.depth:
+                stats.depth = g
+            crates, hero = level.unpack(key)
+            if crates & ~goal_mask == 0:
+                with incumbent.get_lock():
+                    if g < incumbent.value:
+                        incumbent.value = g
+                        results.put(("solution", g, key))
+                continue
+            for cell, direction, new_crates in pushes(level, crates, reachable(level, crates, hero), stats):
+                stats.generated += 1
+                new_key = normalized(level, new_crates, cell)
+                owner = node_hash(level, new_key) % workers
+                if owner == index:
+                    add(g + 1, new_key, key, cell << 2 | direction)
+                else:
+                    outbox[owner].append((g + 1, new_key, key, cell << 2 | direction))
+        if len(frontier) > stats.frontier_peak:
+            stats.frontier_peak = len(frontier)
+        expanded[index] = stats.expanded
+        for owner, batch in enumerate(outbox):
+            if batch:
+                sent[index] += 1
+                inboxes[owner].put(("nodes", batch))
+                outbox[owner] = []
+
+
+def hda_star_pushes(
+    level: Level,
+    crates: int,
+    hero: int,
+    heuristic: Heuristic = matching_heuristic,
+    workers: Optional[int] = None,
+    stats: Optional[SolverStats] = None,
+) -> Optional[List[Push]]:
+    """
+    hash-distributed A* over pushes on workers processes (default: one per CPU), returns a push-optimal
+    list of pushes or None. with a single worker, runs the single-core A* instead
+    """
+    if stats is None:
+        stats = SolverStats()
+    workers = workers or os.cpu_count() or 1
+    if crates & ~level.goal_mask == 0:
+        return []
+    if workers == 1:
+        return astar_pushes(level, crates, hero, heuristic, stats)
+    context = mp.get_context()
+    inboxes = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+    # one more slot of sent batches for the initial batch, sent by this process
+    sent, received = context.Array("q", workers + 1), context.Array("q", workers)
+    idle = context.Array("b", workers)
+    expanded = context.Array("q", workers)  # live count of the nodes expanded by each worker
+    incumbent = context.Value("q", UNREACHABLE)
+    processes = [
+        context.Process(
+            target=worker,
+            args=(n, level, heuristic, inboxes, results, sent, received, idle, expanded, incumbent),
+            daemon=True,
+        )
+        for n in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    start = normalized(level, crates, hero)
+    sent[workers] += 1
+    inboxes[node_hash(level, start) % workers].put(("nodes", [(0, start, -1, 0)]))
+
+    solutions: Dict[int, int] = {}  # g -> goal key, as reported by the workers
+    push_list = None
+    base = stats.expanded
+
+    def terminated() -> bool:
+        """every worker idle and every batch received, with the same counts in two snapshots"""
+        snapshot = (all(idle), sum(sent), sum(received))
+        return snapshot[0] and snapshot[1] == snapshot[2] and snapshot == (all(idle), sum(sent), sum(received))
+
+    try:
+        with stats.phase("search"):
+            while True:
+                try:
+                    message = results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    message = None
+                if message is None:
+                    check_workers(processes)
+                elif message[0] == "solution":
+                    solutions[message[1]] = message[2]
+                elif terminated():
+                    break
+                stats.expanded = base + sum(expanded)
+                if stats.expanded >= stats.next_check:
+                    stats.report()
+
+        with stats.phase("path"):
+            if incumbent.value < UNREACHABLE:
+                # the report of the incumbent may still be on its way
+                while incumbent.value not in solutions:
+                    message = receive(results, processes)
+                    if message[0] == "solution":
+                        solutions[message[1]] = message[2]
+                push_list = []
+                key = solutions[incumbent.value]
+                while True:
+                    inboxes[node_hash(level, key) % workers].put(("parent", key))
+                    message = receive(results, processes)
+                    while message[0] != "parent":
+                        message = receive(results, processes)
+                    _, _, parent, push = message
+                    if parent < 0:
+                        break
+                    push_list.append((push >> 2, push & 3))
+                    key = parent
+                push_list.reverse()
+    finally:
+        for inbox in inboxes:
+            inbox.put(("stop",))
+        stats.expanded = base  # replaced by the final counts of the workers
+        stopped = 0
+        deadline = time.perf_counter() + 5
+        while stopped < workers:
+            try:
+                message = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if all(process.exitcode is not None for process in processes) or time.perf_counter() > deadline:
+                    break
+                continue
+            if message[0] == "stats":
+                stopped += 1
+                stats.merge(message[1])
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    return push_list
+
+
+def solve_hda(
+    state: State,
+    workers: Optional[int] = None,
+    heuristic: Heuristic = matching_heuristic,
+    stats: Optional[SolverStats] = None,
+) -> List[Action]:
+    """returns a push-optimal list of actions that solve the specified state, using HDA* on workers processes"""
+    if stats is None:
+        stats = SolverStats()
+    bit = bitboard.from_state(state)
+    push_list = hda_star_pushes(bit.level, bit.crates, bit.hero, heuristic, workers, stats)
+    if push_list is None:
+        raise NoSolutionException()
+    with stats.phase("expand"):
+        return [actions[n] for n in expand(bit.level, bit.crates, bit.hero, push_list)]
+
+
+def hda_speedup(state: State, workers: Optional[int] = None) -> Dict[str, Optional[float]]:
+    """
+    times the single-core A* and HDA* on the specified state, returns both times, the number of
+    processes HDA* searched on, the number of CPUs and the speedup. the speedup is None on a single
+    CPU (or with a single worker, where HDA* runs A*): the workers could only share the same core
+    """
+    workers = workers or os.cpu_count() or 1
+    cpus = os.cpu_count() or 1
+    bit = bitboard.from_state(state)
+    begin = time.perf_counter()
+    astar_pushes(bit.level, bit.crates, bit.hero)
+    serial = time.perf_counter() - begin
+    begin = time.perf_counter()
+    hda_star_pushes(bit.level, bit.crates, bit.hero, workers=workers)
+    parallel = time.perf_counter() - begin
+    return {
+        "astar": serial,
+        "hda*": parallel,
+        "workers": workers,
+        "cpus": cpus,
+        "speedup": serial / parallel if cpus > 1 and workers > 1 else None,
+    }
@@ -0,0 +1,374 @@
+""" push-level (macro-move) search
+
+Successors are crate pushes only: a flood fill finds every cell the hero can
+walk to, and each node stores the hero on the first reachable cell (in
+row-major order) so that nodes which only differ by the hero position inside
+the same region are merged. Walking segments are filled back in when the path
+is rebuilt.
+Nodes use the bitboard encoding: (crates bitmask, hero cell) over a Level.
+"""
+from collections import deque
+from typing import Iterator, List, Optional, Tuple, Dict, Mapping, MutableMapping
+
+from ..Level import Level, Symmetry
+from .sokoban import State, Action, NoSolutionException, actions
+from .deadlocks import is_deadlock, mask_predicate
+from .stats import SolverStats
+from .visited import VisitedStore
+from . import bitboard
+
+# a push is a (cell of the crate, direction) pair
+Push = Tuple[int, int]
+
+# cells of the boolean arrays of a batch of layer_pushes, which bounds the number of nodes per batch
+BATCH_CELLS = 1 << 22
+
+
+def reachable(level: Level, crates: int, hero: int) -> int:
+    """returns the bitmask of the cells the hero can walk to"""
+    neighbours = level.neighbours
+    blocked = crates | 1 << hero
+    stack = [hero]
+    while stack:
+        for n in neighbours[stack.pop()]:
+            if n >= 0 and not blocked >> n & 1:
+                blocked |= 1 << n
+                stack.append(n)
+    return blocked ^ crates
+
+
+def canonical(reach: int) -> int:
+    """returns the canonical hero cell of a reachable region (its first cell)"""
+    return (reach & -reach).bit_length() - 1
+
+
+def pushes(level: Level, crates: int, reach: int, stats: Optional[SolverStats] = None) -> Iterator[Tuple[int, int, int]]:
+    """
+    yields (crate cell, direction, new crates) for every push the hero can reach,
+    except the pushes onto dead squares and the pushes which create a deadlock
+    """
+    neighbours = level.neighbours
+    dead_mask = level.dead_mask
+    remaining = crates
+    while remaining:
+        low = remaining & -remaining
+        remaining ^= low
+        cell = low.bit_length() - 1
+        around = neighbours[cell]
+        for direction in range(4):
+            behind = around[direction ^ 1]  # 0 <-> 1 (left/right), 2 <-> 3 (up/down)
+            beyond = around[direction]
+            if behind >= 0 and beyond >= 0 and reach >> behind & 1 and not crates >> beyond & 1:
+                new_crates = crates ^ low ^ (1 << beyond)
+                if dead_mask >> beyond & 1 or is_deadlock(level, mask_predicate(new_crates), beyond):
+                    if stats is not None:
+                        stats.pruned += 1
+                    continue
+                yield cell, direction, new_crates
+
+
+def layer_pushes(level: Level, keys: List[int], stats: Optional[SolverStats] = None) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    batched version of pushes over a list of packed nodes, with NumPy (see grid): the reachable regions
+    of all the nodes are flood filled together, the pushes are found with array operations, and the
+    children are normalized by a second batched flood fill.
+    yields (parent key, crate cell, direction, normalized child key), with the pruning of pushes
+    """
+    from .. import grid
+    from ..grid import np
+    n = len(level.cells)
+    hero_bits = level.hero_bits
+    table = grid.neighbour_table(level)
+    parents = [key >> hero_bits for key in keys]
+    crates = grid.masks_to_array(level, parents)
+    rows = np.arange(len(keys))
+    seeds = np.zeros_like(crates)
+    seeds[rows, [key & ((1 << hero_bits) - 1) for key in keys]] = True
+    # the sentinel cell (walls) is neither reachable nor free
+    reach = np.zeros((len(keys), n + 1), dtype=bool)
+    reach[:, :n] = grid.flood(level, seeds, ~crates)
+    free = np.zeros((len(keys), n + 1), dtype=bool)
+    free[:, :n] = ~crates
+    dead = np.ones(n + 1, dtype=bool)
+    dead[:n] = grid.masks_to_array(level, [level.dead_mask])[0]
+    children = []
+    for direction in range(4):
+        behind, beyond = table[:n, direction ^ 1], table[:n, direction]
+        possible = crates & reach[:, behind] & free[:, beyond]
+        if stats is not None:
+            stats.pruned += int(np.count_nonzero(possible & dead[beyond]))
+        for row, cell in zip(*np.nonzero(possible & ~dead[beyond])):
+            row, cell = int(row), int(cell)
+            target = int(beyond[cell])
+            new_crates = parents[row] ^ (1 << cell) ^ (1 << target)
+            if is_deadlock(level, mask_predicate(new_crates), target):
+                if stats is not None:
+                    stats.pruned += 1
+                continue
+            children.append((row, cell, direction, new_crates))
+    if not children:
+        return
+    seeds = np.zeros((len(children), n), dtype=bool)
+    seeds[np.arange(len(children)), [cell for _, cell, _, _ in children]] = True
+    new_crates = grid.masks_to_array(level, [child[3] for child in children])
+    # canonical cell: the first reachable cell
+    heroes = grid.flood(level, seeds, ~new_crates).argmax(axis=1).tolist()
+    for (row, cell, direction, crates_mask), hero in zip(children, heroes):
+        yield keys[row], cell, direction, crates_mask << hero_bits | hero
+
+
+def normalized(level: Level, crates: int, hero: int) -> int:
+    """returns the packed node of a (crates, hero) pair, hero moved to its canonical cell"""
+    return level.pack(crates, canonical(reachable(level, crates, hero)))
+
+
+def transform(symmetry: Symmetry, mask: int) -> int:
+    """returns the image of a bitmask of cells by a symmetry of the level"""
+    cells = symmetry.cells
+    result = 0
+    while mask:
+        low = mask & -mask
+        result |= 1 << cells[low.bit_length() - 1]
+        mask ^= low
+    return result
+
+
+def inverse(symmetry: Symmetry) -> Symmetry:
+    """returns the inverse of a symmetry"""
+    cells, directions = [0] * len(symmetry.cells), [0] * 4
+    for n, image in enumerate(symmetry.cells):
+        cells[image] = n
+    for d, image in enumerate(symmetry.directions):
+        directions[image] = d
+    return Symmetry(tuple(cells), tuple(directions))
+
+
+def symmetric_normalized(level: Level, crates: int, hero: int) -> Tuple[int, int]:
+    """
+    returns the smallest packed node among the images of a (crates, hero) pair by the symmetries
+    of the level (hero moved to its canonical cell), and the index of the symmetry which gives it
+    """
+    reach = reachable(level, crates, hero)
+    best, best_index = level.pack(crates, canonical(reach)), 0
+    for index in range(1, len(level.symmetries)):
+        symmetry = level.symmetries[index]
+        moved = transform(symmetry, crates)
+        if moved > best >> level.hero_bits:
+            continue
+        key = level.pack(moved, canonical(transform(symmetry, reach)))
+        if key < best:
+            best, best_index = key, index
+    return best, best_index
+
+
+def walk(level: Level, crates: int, start: int, target: int) -> List[int]:
+    """returns the directions of a shortest walk from start to target, without pushing"""
+    neighbours = level.neighbours
+    parents: Dict[int, Tuple[int, int]] = {start: (-1, -1)}
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        if cell == target:
+            path = []
+            while cell != start:
+                cell, direction = parents[cell]
+                path.append(direction)
+            return path[::-1]
+        for direction, n in enumerate(neighbours[cell]):
+            if n >= 0 and n not in parents and not crates >> n & 1:
+                parents[n] = (cell, direction)
+                queue.append(n)
+    raise NoSolutionException(f"cell {target} cannot be reached from cell {start}")
+
+
+def walk_distances(level: Level, crates: int, start: int) -> Dict[int, int]:
+    """returns the length of a shortest walk from start to every cell the hero can walk to"""
+    neighbours = level.neighbours
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        for n in neighbours[cell]:
+            if n >= 0 and n not in distances and not crates >> n & 1:
+                distances[n] = distances[cell] + 1
+                queue.append(n)
+    return distances
+
+
+def expand(level: Level, crates: int, hero: int, push_list: List[Push]) -> List[int]:
+    """
+    rebuilds the full list of action indices (see sokoban.actions) of a list of pushes,
+    starting from the real position of the hero
+    """
+    result = []
+    for cell, direction in push_list:
+        behind = level.neighbours[cell][direction ^ 1]
+        result.extend(walk(level, crates, hero, behind))
+        result.append(4 + direction)
+        crates ^= (1 << cell) | (1 << level.neighbours[cell][direction])
+        hero = cell
+    return result
+
+
+def extract_pushes(level: Level, hero: int, indices: List[int]) -> List[Push]:
+    """inverse of expand: returns the pushes of a list of action indices played from the hero cell"""
+    push_list = []
+    for n in indices:
+        direction = n & 3
+        hero = level.neighbours[hero][direction]
+        if n >= 4:
+            push_list.append((hero, direction))
+    return push_list
+
+
+def build_pushes(level: Level, key: int, precedents: Mapping[int, int]) -> List[Push]:
+    """rebuilds the list of pushes leading to a packed node"""
+    shift = level.hero_bits + 2
+    path = []
+    while precedents[key] >= 0:
+        value = precedents[key]
+        path.append(((value & ((1 << shift) - 1)) >> 2, value & 3))
+        key = value >> shift
+    return path[::-1]
+
+
+def build_symmetric_pushes(level: Level, key: int, precedents: Mapping[int, int], start_index: int) -> List[Push]:
+    """
+    rebuilds the list of pushes leading to a node stored by symmetric_normalized, precedents
+    mapping it to (packed parent << shift + 3 | symmetry index << shift | crate cell << 2 | direction).
+    each push is in the coordinates of its parent node, and is mapped back to the real ones
+    through the symmetries met on the way from the start node (start_index for the start itself)
+    """
+    shift = level.hero_bits + 2
+    steps = []
+    while precedents[key] >= 0:
+        value = precedents[key]
+        steps.append(((value & ((1 << shift) - 1)) >> 2, value & 3, value >> shift & 7))
+        key = value >> shift + 3
+    # back maps the coordinates of the current node to the real ones
+    back = inverse(level.symmetries[start_index])
+    path = []
+    for cell, direction, index in reversed(steps):
+        path.append((back.cells[cell], back.directions[direction]))
+        if index:
+            undo = inverse(level.symmetries[index])
+            back = Symmetry(
+                tuple(back.cells[n] for n in undo.cells),
+                tuple(back.directions[d] for d in undo.directions),
+            )
+    return path
+
+
+def plain_normalized(level: Level, crates: int, hero: int) -> Tuple[int, int]:
+    """same as symmetric_normalized, ignoring the symmetries of the level"""
+    return normalized(level, crates, hero), 0
+
+
+def batched_bfs_pushes(
+    level: Level, crates: int, hero: int, max_pushes=0, stats: Optional[SolverStats] = None, budget=0
+) -> Optional[List[Push]]:
+    """
+    bfs_pushes expanding the nodes a layer at a time with layer_pushes (needs NumPy), in batches of
+    at most BATCH_CELLS cells; precedents maps each packed node to (packed parent << shift | crate cell << 2
+    | direction). the symmetries of the level are not used
+    """
+    if stats is None:
+        stats = SolverStats()
+    shift = level.hero_bits + 2
+    goal_mask = level.goal_mask
+    start = normalized(level, crates, hero)
+    precedents: MutableMapping[int, int] = VisitedStore.for_level(level, shift, budget) if budget else {}
+    precedents[start] = -1
+    layer = [start]
+    size = max(1, BATCH_CELLS // max(1, len(level.cells)))
+    depth = 0
+    with stats.phase("search"):
+        while layer and (max_pushes == 0 or depth <= max_pushes):
+            for key in layer:
+                if key >> level.hero_bits & ~goal_mask == 0:
+                    return build_pushes(level, key, precedents)
+            next_layer = []
+            for begin in range(0, len(layer), size):
+                batch = layer[begin:begin + size]
+                stats.expanded += len(batch)
+                if stats.expanded >= stats.next_check:
+                    stats.report()
+                for key, cell, direction, new_key in layer_pushes(level, batch, stats):
+                    stats.generated += 1
+                    if new_key in precedents:
+                        stats.duplicates += 1
+                        continue
+                    precedents[new_key] = key << shift | cell << 2 | direction
+                    next_layer.append(new_key)
+            layer = next_layer
+            if len(layer) > stats.frontier_peak:
+                stats.frontier_peak = len(layer)
+            depth += 1
+            stats.depth = depth
+    return None
+
+
+def bfs_pushes(
+    level: Level, crates: int, hero: int, max_pushes=0, stats: Optional[SolverStats] = None, budget=0,
+    symmetry=True, batched=False,
+) -> Optional[List[Push]]:
+    """
+    breadth-first search over pushes, returns a push-optimal list of pushes or None.
+    precedents maps each packed node to (packed parent << shift + 3 | symmetry index << shift | crate cell << 2
+    | direction), past budget entries (0: no limit) they are spilled to disk (see visited.VisitedStore).
+    with symmetry, the nodes which are images of each other by a symmetry of the level are merged.
+    batched runs batched_bfs_pushes instead when NumPy is installed
+    """
+    if batched:
+        from .. import grid  # NumPy is only imported by the batched search
+        if grid.available:
+            return batched_bfs_pushes(level, crates, hero, max_pushes, stats, budget)
+    if stats is None:
+        stats = SolverStats()
+    shift = level.hero_bits + 2
+    goal_mask = level.goal_mask
+    normalize = symmetric_normalized if symmetry and len(level.symmetries) > 1 else plain_normalized
+    start, start_index = normalize(level, crates, hero)
+    precedents: MutableMapping[int, int] = VisitedStore.for_level(level, shift + 3, budget) if budget else {}
+    precedents[start] = -1
+    queue = deque([start])
+    depth, layer_end = 0, 1
+    with stats.phase("search"):
+        while queue and (max_pushes == 0 or depth <= max_pushes):
+            key = queue.popleft()
+            stats.expanded += 1
+            if stats.expanded >= stats.next_check:
+                stats.report()
+            crates, hero = level.unpack(key)
+            if crates & ~goal_mask == 0:
+                return build_symmetric_pushes(level, key, precedents, start_index)
+            for cell, direction, new_crates in pushes(level, crates, reachable(level, crates, hero), stats):
+                stats.generated += 1
+                new_key, index = normalize(level, new_crates, cell)
+                if new_key in precedents:
+                    stats.duplicates += 1
+                    continue
+                precedents[new_key] = key << shift + 3 | index << shift | cell << 2 | direction
+                queue.append(new_key)
+            if len(queue) > stats.frontier_peak:
+                stats.frontier_peak = len(queue)
+            layer_end -= 1
+            if layer_end == 0:
+                depth += 1
+                stats.depth = depth
+                layer_end = len(queue)
+    return None
+
+
+def solve_pushes(
+    state: State, max_pushes=0, stats: Optional[SolverStats] = None, budget=0, symmetry=True, batched=False
+) -> List[Action]:
+    """returns a list of actions that solve the specified state with the minimum number of pushes"""
+    if stats is None:
+        stats = SolverStats()
+    bit = bitboard.from_state(state)
+    push_list = bfs_pushes(bit.level, bit.crates, bit.hero, max_pushes, stats, budget, symmetry, batched)
+    if push_list is None:
+        raise NoSolutionException()
+    with stats.phase("expand"):
+        return [actions[n] for n in expand(bit.level, bit.crates, bit.hero, push_list)]
@@ -1,7 +1,13 @@
 """ functional programming version of the Sokoban solver"""
-from typing import Set, Tuple, Callable, NamedTuple, Dict, Optional, List
+from collections import deque
+from typing import Set, Tuple, Callable, NamedTuple, Dict, Optional, List, FrozenSet, Iterator
 import inspect as i
 
+from ..Level import Level
+from ..exceptions import InvalidLevelException, ErrorHelpStrings
+from .deadlocks import is_deadlock
+from .stats import SolverStats, print_progress
+
 
 class PreconditionUnmetException(Exception):
     """Custom Exception thrown when an action with an unmet precondition was going to be executed"""
@@ -16,17 +22,51 @@ class NoSolutionException(Exception):
 
 
 Position = Tuple[int, int]
-PositionCollection = Tuple[Position]
-State = NamedTuple(
-    "State",
-    [
-        ("walls", PositionCollection),
-        ("goals", PositionCollection),
-        ("crates", PositionCollection),
-        ("hero", Position),
-        ("map_size", Tuple[int, int]),
-    ],
-)
+PositionCollection = FrozenSet[Position]
+
+
+class State(NamedTuple):
+    """
+    Search node: only the crates and the hero, the static data lives in the shared Level.
+    The Zobrist hash is updated incrementally by move_crate and move_hero.
+    """
+
+    level: Level
+    crates: PositionCollection
+    hero: Position
+    zobrist: int
+
+    @property
+    def walls(self) -> PositionCollection:
+        """walls of the level"""
+        return self.level.walls
+
+    @property
+    def goals(self) -> PositionCollection:
+        """goals of the level"""
+        return self.level.goals
+
+    @property
+    def map_size(self) -> Tuple[int, int]:
+        """size of the level"""
+        return self.level.map_size
+
+    def __hash__(self) -> int:
+        return self.zobrist
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, State):
+            return NotImplemented
+        return (
+            self.zobrist == other.zobrist
+            and self.hero == other.hero
+            and self.crates == other.crates
+        )
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+
 PreCondition = Callable[[State], bool]
 PostCondition = Callable[[State], State]
 Action = NamedTuple(
@@ -57,26 +97,29 @@ def bottom(pos: Position) -> Position:
 
 def move_crate(state: State, old_pos: Position, new_pos: Position):
     """returns a new state in which the crate at pos old_pos has been moved to new_pos"""
-    new_crates = tuple(
-        (x, y) if (x, y) != old_pos else new_pos for x, y in state.crates
-    )
-    new_state = State._make(
-        [state.walls, state.goals, new_crates, state.hero, state.map_size]
+    keys = state.level.crate_keys
+    return State(
+        state.level,
+        state.crates.difference((old_pos,)).union((new_pos,)),
+        state.hero,
+        state.zobrist ^ keys[old_pos] ^ keys[new_pos],
     )
-    return new_state
 
 
 def move_hero(state: State, pos: Position):
     """returns a new state in which the hero has been moved to position pos"""
-    new_state = State._make(
-        [state.walls, state.goals, state.crates, pos, state.map_size]
+    keys = state.level.hero_keys
+    return State(
+        state.level,
+        state.crates,
+        pos,
+        state.zobrist ^ keys[state.hero] ^ keys[pos],
     )
-    return new_state
 
 
 move_left = Action(
     {
-        lambda state: left(state.hero) not in state.walls,
+        lambda state: left(state.hero) in state.level.index,
         lambda state: left(state.hero) not in state.crates,
     },
     [
@@ -86,7 +129,7 @@ move_left = Action(
 
 move_right = Action(
     {
-        lambda state: right(state.hero) not in state.walls,
+        lambda state: right(state.hero) in state.level.index,
         lambda state: right(state.hero) not in state.crates,
     },
     [
@@ -96,7 +139,7 @@ move_right = Action(
 
 move_up = Action(
     {
-        lambda state: top(state.hero) not in state.walls,
+        lambda state: top(state.hero) in state.level.index,
         lambda state: top(state.hero) not in state.crates,
     },
     [
@@ -106,7 +149,7 @@ move_up = Action(
 
 move_down = Action(
     {
-        lambda state: bottom(state.hero) not in state.walls,
+        lambda state: bottom(state.hero) in state.level.index,
         lambda state: bottom(state.hero) not in state.crates,
     },
     [
@@ -117,7 +160,7 @@ move_down = Action(
 push_left = Action(
     {
         lambda state: left(state.hero) in state.crates,
-        lambda state: left(left(state.hero)) not in state.walls,
+        lambda state: left(left(state.hero)) in state.level.index,
         lambda state: left(left(state.hero)) not in state.crates,
     },
     [
@@ -129,7 +172,7 @@ push_left = Action(
 push_right = Action(
     {
         lambda state: right(state.hero) in state.crates,
-        lambda state: right(right(state.hero)) not in state.walls,
+        lambda state: right(right(state.hero)) in state.level.index,
         lambda state: right(right(state.hero)) not in state.crates,
     },
     [
@@ -141,7 +184,7 @@ push_right = Action(
 push_up = Action(
     {
         lambda state: top(state.hero) in state.crates,
-        lambda state: top(top(state.hero)) not in state.walls,
+        lambda state: top(top(state.hero)) in state.level.index,
         lambda state: top(top(state.hero)) not in state.crates,
     },
     [
@@ -153,7 +196,7 @@ push_up = Action(
 push_down = Action(
     {
         lambda state: bottom(state.hero) in state.crates,
-        lambda state: bottom(bottom(state.hero)) not in state.walls,
+        lambda state: bottom(bottom(state.hero)) in state.level.index,
         lambda state: bottom(bottom(state.hero)) not in state.crates,
     },
     [
@@ -172,6 +215,43 @@ actions = [
     push_up,
     push_down,
 ]
+# Action tuples hold sets and are not hashable, they are looked up by identity
+action_ids = {id(action): n for n, action in enumerate(actions)}
+
+# direction of each push action
+push_directions = {
+    id(push_left): left,
+    id(push_right): right,
+    id(push_up): top,
+    id(push_down): bottom,
+}
+
+
+def pushed_into_deadlock(state: State, action: Action) -> bool:
+    """
+    Returns True if action is a push which brought a crate onto a dead square
+    or into a deadlock, state being the resulting state
+    """
+    direction = push_directions.get(id(action))
+    if direction is None:
+        return False
+    crate, level = direction(state.hero), state.level
+    if crate in level.dead_squares:
+        return True
+    return is_deadlock(level, lambda cell: level.cells[cell] in state.crates, level.index[crate])
+
+# letters of the actions, in the same order as actions (notation of the Sokoban class)
+action_letters = "gdhbGDHB"
+
+
+def actions_to_string(action_list: List[Action]) -> str:
+    """returns the hdgbHDGB string of a list of actions"""
+    return "".join(action_letters[action_ids[id(action)]] for action in action_list)
+
+
+def string_to_actions(action_string: str) -> List[Action]:
+    """returns the list of actions of a hdgbHDGB string"""
+    return [actions[action_letters.index(letter)] for letter in action_string]
 
 
 def is_win(state: State) -> bool:
@@ -183,12 +263,12 @@ def is_win(state: State) -> bool:
 
 
 def load_from_string(state_string: str) -> State:
-    """Charge un état à partir d'une chaîne de caractères"""
-    murs, buts, caisses, personnage_pos = set(), set(), set(), (0, 0)
+    """Charge un état à partir d'une chaîne de caractères (les lignes courtes sont complétées par du vide)"""
+    murs, buts, caisses, personnage_pos = set(), set(), set(), None
     lines = [line for line in state_string.split("\n") if line != ""]
-    w, h = len(lines[0]), len(lines)
+    w, h = max(len(line) for line in lines), len(lines)
     for y in range(h):
-        for x in range(w):
+        for x in range(len(lines[y])):
             if lines[y][x] == "%":
                 murs.add((x, y))
             elif lines[y][x] == "b":
@@ -203,7 +283,19 @@ def load_from_string(state_string: str) -> State:
             elif lines[y][x] == "q":
                 personnage_pos = (x, y)
                 buts.add((x, y))
-    return State(tuple(murs), tuple(buts), tuple(caisses), personnage_pos, (w, h))
+    if personnage_pos is None:
+        raise InvalidLevelException(
+            "Personnage absent du niveau\n"
+            +
+            ErrorHelpStrings.INVALID_LEVEL_HELP
+        )
+    level = Level(murs, buts, (w, h))
+    return State(
+        level,
+        frozenset(caisses),
+        personnage_pos,
+        level.zobrist(caisses, personnage_pos),
+    )
 
 
 def save_to_string(state: State) -> str:
@@ -241,6 +333,37 @@ def execute(state: State, action: Action) -> State:
     return new_state
 
 
+def successors(state: State) -> Iterator[Tuple[Action, State]]:
+    """
+    yields the (action, new state) pairs of the possible actions, in the order of actions.
+    the moves are read from the neighbour tables of the level: unlike execute, no precondition
+    is called and no exception is raised for the impossible actions
+    """
+    level = state.level
+    cells, crates, hero, zobrist = level.cells, state.crates, state.hero, state.zobrist
+    around = level.neighbours[level.index[hero]]
+    hero_keys = level.hero_keys
+    for direction in range(4):
+        target = around[direction]
+        if target >= 0 and cells[target] not in crates:
+            pos = cells[target]
+            yield actions[direction], State(level, crates, pos, zobrist ^ hero_keys[hero] ^ hero_keys[pos])
+    crate_keys = level.crate_keys
+    for direction in range(4):
+        target = around[direction]
+        if target < 0 or cells[target] not in crates:
+            continue
+        beyond = level.neighbours[target][direction]
+        if beyond >= 0 and cells[beyond] not in crates:
+            pos, new_pos = cells[target], cells[beyond]
+            yield actions[4 + direction], State(
+                level,
+                crates.difference((pos,)).union((new_pos,)),
+                pos,
+                zobrist ^ crate_keys[pos] ^ crate_keys[new_pos] ^ hero_keys[hero] ^ hero_keys[pos],
+            )
+
+
 def build_path(
     initial_state: State,
     current_state: State,
@@ -255,42 +378,105 @@ def build_path(
     return path[::-1]
 
 
-def solve_bfs(state: State, max_depth=0, debug=False) -> List[Action]:
-    """returns a list of actions that solve the specified state"""
-    queue = [(state, 0)]  # store the current depth of the search
-    initial_state = state
-    precedents: Dict[State, Optional[Tuple[Action, State]]] = {state: None}
+def solve_bfs(state: State, max_depth=0, debug=False, stats: Optional[SolverStats] = None) -> List[Action]:
+    """
+    returns a list of actions that solve the specified state.
+    debug prints the progress of the search, at most once a second (see SolverStats to pass another callback)
+    """
+    if stats is None:
+        stats = SolverStats()
     if debug:
         print("[i] Start of Breadth-First Search")
-        i = 0
-    while queue and (max_depth == 0 or queue[0][1] < max_depth):
-        current_state, current_depth = queue.pop(0)
-        if debug:
-            print(f"\r[i] {i} states traversed", end="")
-            i += 1
-        if is_win(current_state):
-            return build_path(initial_state, current_state, precedents)
-        for action in actions:
-            try:
-                new_state = execute(current_state, action)
-            except PreconditionUnmetException:
-                continue
-            if new_state not in precedents:
+        stats.progress = stats.progress or print_progress
+    queue = deque([(state, 0)])  # store the current depth of the search
+    initial_state = state
+    precedents: Dict[State, Optional[Tuple[Action, State]]] = {state: None}
+    with stats.phase("search"):
+        while queue and (max_depth == 0 or queue[0][1] < max_depth):
+            current_state, current_depth = queue.popleft()
+            stats.expanded += 1
+            if stats.expanded >= stats.next_check:
+                stats.report()
+            if current_depth > stats.depth:
+                stats.depth = current_depth
+            if is_win(current_state):
+                break
+            for action, new_state in successors(current_state):
+                stats.generated += 1
+                if pushed_into_deadlock(new_state, action):
+                    stats.pruned += 1
+                    continue
+                if new_state in precedents:
+                    stats.duplicates += 1
+                    continue
                 queue.append((new_state, current_depth + 1))
                 precedents[new_state] = (action, current_state)
-    raise NoSolutionException()
-
-
-def solve_iterative_deepening(state: State, max_depth=40, debug=False) -> List[Action]:
-    """returns a list of actions that solve the specified state"""
+            if len(queue) > stats.frontier_peak:
+                stats.frontier_peak = len(queue)
+        else:
+            raise NoSolutionException()
+    with stats.phase("path"):
+        return build_path(initial_state, current_state, precedents)
+
+
+def depth_limited_search(state: State, depth: int, stats: SolverStats) -> Optional[List[Action]]:
+    """
+    depth-first search for a solution of at most depth actions.
+    only the current path is kept in memory: the states, the chosen actions and
+    an iterator over the remaining successors of each state
+    """
+    if is_win(state):
+        return []
+    path = [state]
+    on_path = {state}
+    chosen: List[Action] = []
+    stack = [successors(state)] if depth > 0 else []
+    while stack:
+        for action, new_state in stack[-1]:
+            stats.generated += 1
+            if pushed_into_deadlock(new_state, action):
+                stats.pruned += 1
+                continue
+            if new_state in on_path:
+                stats.duplicates += 1
+                continue
+            chosen.append(action)
+            if is_win(new_state):
+                return chosen
+            if len(path) < depth:
+                path.append(new_state)
+                on_path.add(new_state)
+                stack.append(successors(new_state))
+                stats.expanded += 1
+                if stats.expanded >= stats.next_check:
+                    stats.report()
+                if len(path) > stats.frontier_peak:
+                    stats.frontier_peak = len(path)
+                break
+            chosen.pop()
+        else:
+            stack.pop()
+            on_path.discard(path.pop())
+            if chosen:
+                chosen.pop()
+    return None
+
+
+def solve_iterative_deepening(state: State, max_depth=40, debug=False, stats: Optional[SolverStats] = None) -> List[Action]:
+    """
+    returns a shortest list of actions that solve the specified state,
+    using depth-first iterative deepening (memory in O(depth)).
+    debug prints the progress of the search, at most once a second
+    """
+    if stats is None:
+        stats = SolverStats()
     if debug:
         print("[i] Start of iterative deepening uninformed search")
-    for depth in range(1, max_depth):
-        if debug:
-            print("\r[-] Depth:", depth, end="")
-        try:
-            solution = solve_bfs(state, depth)
-            return solution
-        except NoSolutionException:
-            continue
+        stats.progress = stats.progress or print_progress
+    with stats.phase("search"):
+        for depth in range(max_depth + 1):
+            stats.depth = depth
+            solution = depth_limited_search(state, depth, stats)
+            if solution is not None:
+                return solution
     raise NoSolutionException()
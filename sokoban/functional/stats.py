@@ -0,0 +1,94 @@
+""" statistics filled in by the solvers """
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+Progress = Callable[["SolverStats"], None]
+
+
+class SolverStats:
+    """
+    Counters of a search, pass an instance to a solver to read them after (or during) the search.
+    progress is called with the stats while the search runs, every check_every expanded nodes
+    but at most once every interval seconds (0: at every check); it may raise an exception
+    (BudgetExceededException for instance) to cancel the search.
+    """
+
+    def __init__(self, progress: Optional[Progress] = None, interval: float = 1.0, check_every: int = 1000) -> None:
+        self.expanded = 0  # nodes taken out of the frontier
+        self.generated = 0  # successors produced
+        self.duplicates = 0  # successors already known, discarded
+        self.pruned = 0  # successors discarded by dead square and deadlock detection
+        self.frontier_peak = 0  # largest frontier (queue, open list, or path of a depth-first search)
+        self.depth = 0  # deepest node reached, in moves or pushes
+        self.phases: Dict[str, float] = {}  # seconds spent in each phase of the solver
+        self.progress = progress
+        self.interval = interval
+        self.check_every = check_every
+        # the solvers call report() once expanded reaches next_check, a single comparison per node
+        self.next_check = check_every
+        self.last_report = time.perf_counter()
+
+    def report(self) -> None:
+        """calls progress if interval seconds went by since the last call, schedules the next check"""
+        self.next_check = self.expanded + self.check_every
+        if self.progress is None:
+            return
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.progress(self)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """adds the time spent in the with block to the phase name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def elapsed(self) -> float:
+        """seconds spent in all phases"""
+        return sum(self.phases.values())
+
+    def merge(self, other: "SolverStats") -> None:
+        """adds the statistics of another search (a worker of a parallel search) to these ones"""
+        self.expanded += other.expanded
+        self.generated += other.generated
+        self.duplicates += other.duplicates
+        self.pruned += other.pruned
+        self.frontier_peak = max(self.frontier_peak, other.frontier_peak)
+        self.depth = max(self.depth, other.depth)
+        for name, seconds in other.phases.items():  # parallel phases overlap, keep the longest
+            self.phases[name] = max(self.phases.get(name, 0.0), seconds)
+
+    def as_dict(self) -> Dict:
+        """the statistics, ready to be serialized as JSON"""
+        return {
+            'expanded': self.expanded,
+            'generated': self.generated,
+            'duplicates': self.duplicates,
+            'pruned': self.pruned,
+            'frontier_peak': self.frontier_peak,
+            'depth': self.depth,
+            'phases': dict(self.phases),
+        }
+
+    def __getstate__(self) -> Dict:
+        # the progress callback stays in the process which created the stats
+        state = dict(vars(self))
+        state['progress'] = None
+        return state
+
+    def __repr__(self) -> str:
+        return f"SolverStats({', '.join(f'{k}={v}' for k, v in self.as_dict().items())})"
+
+
+def print_progress(stats: SolverStats) -> None:
+    """progress callback printing the counters on a single line"""
+    print(
+        f"\r[i] {stats.expanded} states traversed, depth {stats.depth}, frontier peak {stats.frontier_peak}",
+        end="", flush=True,
+    )
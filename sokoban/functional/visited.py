@@ -0,0 +1,147 @@
+""" visited set and parent pointers of a search, spilled to disk past a memory budget
+
+The searches map every packed node they reach (see Level.pack) to a parent
+pointer (packed parent << shift | move). VisitedStore keeps the most recent
+entries in a dict (the hot tier); once the dict holds budget entries, they are
+all moved to an open-addressing hash table with linear probing, stored as
+fixed-width records in a memory-mapped temporary file. The file doubles in
+size when it gets half full. Lookups try the dict first, then the file, so a
+search, and the path rebuilt from the parent pointers, work across both
+tiers: slower, but bounded by the disk instead of the memory.
+"""
+import mmap
+import tempfile
+from typing import Dict, Optional, Tuple
+
+from ..Level import Level
+
+# multiplier of the Fibonacci hashing of the keys into the slots of the table
+GOLDEN = 0x9E3779B97F4A7C15
+MASK_64 = (1 << 64) - 1
+
+
+class VisitedStore:
+    """
+    Map of packed nodes (ints of at most key_bits bits) to parent pointers (ints of at most
+    value_bits bits, or -1), with at most budget entries in memory.
+    A record of the file is a used flag, the key and the value + 1, in little-endian order.
+    """
+
+    def __init__(self, key_bits: int, value_bits: int, budget: int, directory: Optional[str] = None) -> None:
+        if budget <= 0:
+            raise ValueError("the budget must be a positive number of entries")
+        self.key_size = (key_bits + 7) // 8
+        self.value_size = (value_bits + 8) // 8  # one more bit for the value + 1
+        self.record_size = 1 + self.key_size + self.value_size
+        self.budget = budget
+        self.directory = directory
+        self.hot: Dict[int, int] = {}
+        self.spilled = 0  # entries in the file
+        self.bits = 0  # the file holds 2 ** bits records
+        self.file = None
+        self.map: Optional[mmap.mmap] = None
+
+    @classmethod
+    def for_level(cls, level: Level, shift: int, budget: int, directory: Optional[str] = None) -> "VisitedStore":
+        """store of the packed nodes of a level, with values packed parent << shift | move"""
+        key_bits = len(level.cells) + level.hero_bits
+        return cls(key_bits, key_bits + shift, budget, directory)
+
+    def __len__(self) -> int:
+        return len(self.hot) + self.spilled
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.hot or self.spilled > 0 and self.probe(key)[1]
+
+    def __getitem__(self, key: int) -> int:
+        value = self.hot.get(key)
+        if value is not None:
+            return value
+        if self.spilled:
+            offset, found = self.probe(key)
+            if found:
+                start = offset + 1 + self.key_size
+                return int.from_bytes(self.map[start:start + self.value_size], 'little') - 1
+        raise KeyError(key)
+
+    def __setitem__(self, key: int, value: int) -> None:
+        if self.spilled and key not in self.hot:
+            offset, found = self.probe(key)
+            if found:
+                self.write(offset, key, value)
+                return
+        self.hot[key] = value
+        if len(self.hot) >= self.budget:
+            self.spill()
+
+    def get(self, key: int, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def probe(self, key: int) -> Tuple[int, bool]:
+        """returns (offset of the record of key in the file or of the empty record ending its probe sequence, found)"""
+        mask = (1 << self.bits) - 1
+        slot = (hash(key) * GOLDEN & MASK_64) >> (64 - self.bits)
+        key_bytes = key.to_bytes(self.key_size, 'little')
+        end = 1 + self.key_size
+        while True:
+            offset = slot * self.record_size
+            if not self.map[offset]:
+                return offset, False
+            if self.map[offset + 1:offset + end] == key_bytes:
+                return offset, True
+            slot = (slot + 1) & mask
+
+    def write(self, offset: int, key: int, value: int) -> None:
+        """writes the record of a key at offset"""
+        self.map[offset:offset + self.record_size] = (
+            b'\x01' + key.to_bytes(self.key_size, 'little') + (value + 1).to_bytes(self.value_size, 'little')
+        )
+
+    def spill(self) -> None:
+        """moves the entries of the dict to the file, growing it to stay at most half full"""
+        needed = self.spilled + len(self.hot)
+        if 2 * needed > 1 << self.bits:
+            self.grow(max(self.bits + 1, (2 * needed - 1).bit_length()))
+        for key, value in self.hot.items():
+            offset, found = self.probe(key)
+            self.write(offset, key, value)
+            if not found:
+                self.spilled += 1
+        self.hot.clear()
+
+    def grow(self, bits: int) -> None:
+        """moves the records to a new file of 2 ** bits records"""
+        old_map, old_file, old_bits = self.map, self.file, self.bits
+        self.file = tempfile.TemporaryFile(dir=self.directory)
+        self.file.truncate((1 << bits) * self.record_size)
+        self.map = mmap.mmap(self.file.fileno(), (1 << bits) * self.record_size)
+        self.bits = bits
+        if old_map is None:
+            return
+        size = self.record_size
+        for offset in range(0, (1 << old_bits) * size, size):
+            if old_map[offset]:
+                record = old_map[offset:offset + size]
+                key = int.from_bytes(record[1:1 + self.key_size], 'little')
+                new_offset = self.probe(key)[0]
+                self.map[new_offset:new_offset + size] = record
+        old_map.close()
+        old_file.close()
+
+    def close(self) -> None:
+        """deletes the file"""
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+            self.map = self.file = None
+        self.hot.clear()
+        self.spilled = 0
+
+    def __enter__(self) -> "VisitedStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
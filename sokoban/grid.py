@@ -0,0 +1,159 @@
+""" optional NumPy layer of the per-level precomputations and of the batched searches
+
+Level builds its tables with breadth-first searches run cell by cell in
+Python, which takes seconds on large maps with many goals. When NumPy is
+installed, these searches run as batched wavefronts instead: the frontiers of
+many searches (one per goal for the push distances, one per position for the
+flood fills) are a single pair of arrays (search, cell), and each step moves
+every one of them at once by gathering the neighbours of the frontier cells
+in the neighbours table. The cost becomes a few array operations per step of
+the deepest search. The neighbours and 2x2 squares tables are gathered from
+the grid of the cell indices (see wall_mask) rather than looked up cell by
+cell. Without NumPy, available is False and Level keeps its pure Python loops.
+
+Cells are the floor indices of the Level; the tables have an extra sentinel
+cell, len(level.cells), standing for the walls (neighbour -1), so that the
+gathers need no masking.
+"""
+import weakref
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional
+    np = None
+
+from .Level import DIRECTIONS, UNREACHABLE
+
+available = np is not None
+
+# neighbours tables of the levels, built once per level
+_tables: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def neighbour_table(level) -> "np.ndarray":
+    """returns the (cells + 1, 4) array of the neighbours of the cells, the sentinel cell standing for -1"""
+    table = _tables.get(level)
+    if table is None:
+        n = len(level.cells)
+        table = np.full((n + 1, 4), n, dtype=np.intp)
+        if n:
+            neighbours = np.array(level.neighbours, dtype=np.intp)
+            table[:n] = np.where(neighbours >= 0, neighbours, n)
+        _tables[level] = table
+    return table
+
+
+def wall_mask(level) -> "np.ndarray":
+    """returns the (height, width) boolean array of the walls (every cell which is not a floor cell)"""
+    w, h = level.map_size
+    walls = np.ones((h, w), dtype=bool)
+    if level.cells:
+        xs, ys = np.array(level.cells).T
+        walls[ys, xs] = False
+    return walls
+
+
+def cell_tables(level) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    returns the (cells, 4) array of Level.neighbours and the (cells, 4, 3) array of Level.squares,
+    gathered from the grid of the cell indices, padded with walls
+    """
+    floor = ~wall_mask(level)
+    h, w = floor.shape
+    index = np.full((h + 2, w + 2), -1, dtype=np.intp)
+    # row-major, as the indices of Level.cells
+    index[1:-1, 1:-1][floor] = np.arange(len(level.cells))
+    ys, xs = np.nonzero(floor)
+    ys, xs = ys + 1, xs + 1
+    neighbours = np.stack([index[ys + dy, xs + dx] for dx, dy in DIRECTIONS], axis=1)
+    squares = np.stack([
+        np.stack([index[ys, xs + dx], index[ys + dy, xs], index[ys + dy, xs + dx]], axis=1)
+        for dx, dy in ((-1, -1), (1, -1), (-1, 1), (1, 1))
+    ], axis=1)
+    n = len(level.cells)
+    table = np.full((n + 1, 4), n, dtype=np.intp)
+    table[:n] = np.where(neighbours >= 0, neighbours, n)
+    _tables[level] = table
+    return neighbours, squares
+
+
+def cell_array(level, cells: Iterable[int]) -> "np.ndarray":
+    """returns the boolean array (cells + 1) of the given cell indices"""
+    result = np.zeros(len(level.cells) + 1, dtype=bool)
+    result[list(cells)] = True
+    return result
+
+
+def wavefront(table: "np.ndarray", searches: "np.ndarray", cells: "np.ndarray", seen: "np.ndarray"):
+    """
+    yields the successive layers (searches, cells) of a batch of breadth-first searches, from the
+    frontier given as the (searches, cells) pairs, table[cell] being the successors of cell (the
+    sentinel cell when there is none). seen (searches, cells + 1), contiguous, is updated in place,
+    its sentinel column must be True
+    """
+    width = seen.shape[1]
+    flat = seen.reshape(-1)
+    # a cell reached several times in a step is kept once: the last write in claims wins
+    claims = np.empty(seen.size, dtype=np.intp)
+    while len(cells):
+        linear = (searches * width)[:, None] + table[cells]
+        linear = linear[~flat[linear]]
+        order = np.arange(len(linear))
+        claims[linear] = order
+        linear = linear[claims[linear] == order]
+        flat[linear] = True
+        searches, cells = np.divmod(linear, width)
+        yield searches, cells
+
+
+def goal_distances(level) -> "np.ndarray":
+    """
+    returns the (goals, cells) array of the push distances of Level.pull_distances, for all the goals
+    of level.goal_cells at once: the crates are pulled from every goal at the same time
+    """
+    table = neighbour_table(level)
+    n = len(level.cells)
+    # a crate is pulled from cell to origin = the neighbour in direction d, the hero going one cell further
+    pulls = np.where(table[table, np.arange(4)] < n, table, n)
+    goals = np.array(level.goal_cells, dtype=np.intp)
+    distances = np.full((len(goals), n + 1), UNREACHABLE, dtype=np.int64)
+    seen = np.zeros((len(goals), n + 1), dtype=bool)
+    seen[:, n] = True
+    searches = np.arange(len(goals))
+    seen[searches, goals] = True
+    distances[searches, goals] = 0
+    for depth, (searches, cells) in enumerate(wavefront(pulls, searches, goals, seen), 1):
+        distances[searches, cells] = depth
+    return distances[:, :n]
+
+
+def flood(level, seeds: "np.ndarray", free: Optional["np.ndarray"] = None) -> "np.ndarray":
+    """
+    batched flood fills: returns the (batch, cells) boolean array of the cells reachable from the seeds
+    (batch, cells), walking on the free cells (batch, cells) only (None: every floor cell)
+    """
+    table = neighbour_table(level)
+    n = len(level.cells)
+    batch = len(seeds)
+    seen = np.ones((batch, n + 1), dtype=bool)
+    seen[:, :n] = seeds if free is None else ~free | seeds
+    reached = np.zeros((batch, n + 1), dtype=bool)
+    reached[:, :n] = seeds
+    searches, cells = np.nonzero(seeds)
+    for searches, cells in wavefront(table, searches, cells, seen):
+        reached[searches, cells] = True
+    return reached[:, :n]
+
+
+def dead_cells(distances: "np.ndarray") -> List[int]:
+    """returns the cells from which no goal can be reached, given the goal distances"""
+    return np.nonzero((distances >= UNREACHABLE).all(axis=0))[0].tolist()
+
+
+def masks_to_array(level, masks: List[int]) -> "np.ndarray":
+    """returns the (len(masks), cells) boolean array of a list of cell bitmasks"""
+    n = len(level.cells)
+    size = (n + 7) // 8
+    data = np.frombuffer(b"".join(mask.to_bytes(size, "little") for mask in masks), dtype=np.uint8)
+    return np.unpackbits(data.reshape(len(masks), size), axis=1, bitorder="little")[:, :n].astype(bool)
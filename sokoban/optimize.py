@@ -0,0 +1,210 @@
+""" Post-optimization of solutions, in moves and pushes
+
+A solution is cut into its pushes; the walks between them are replaced by
+shortest walks (see functional.pushes.expand), then a window slides over the
+pushes: for each run of window pushes, a uniform-cost search looks for a
+cheaper way (in moves, then pushes) to go from the position before the run to
+the position after it, with the crates kept on the cells they occupy during
+the run. It finds the reorderings of the pushes of several crates and the
+detours which can be avoided. A change is only kept if it is no worse in
+moves and in pushes, so the result is never worse than the input.
+
+usage: python -m sokoban.optimize pairs.sok [--window 8] [--max-nodes 5000]
+       python -m sokoban.optimize pairs.jsonl ('-' for stdin)
+The pairs are read as in sokoban.verify, a JSON line is printed per pair with
+the optimized solution and the metrics before and after.
+"""
+import argparse
+import heapq
+import json
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .Level import Level
+from .exceptions import UndoableActionException, ErrorHelpStrings
+from .functional.pushes import Push, extract_pushes, expand, walk, walk_distances
+from .functional.sokoban import action_letters
+from .verify import Replay, convert, decode, detect_notation, load, read_pairs, replay
+
+Optimization = NamedTuple(
+    "Optimization",
+    [
+        ("solution", str),  # in the notation of the input solution
+        ("before", Replay),
+        ("after", Replay),
+    ],
+)
+
+
+def positions(level: Level, crates: int, hero: int, push_list: List[Push]) -> List[Tuple[int, int]]:
+    """returns the (crates, hero) pairs before the first push and after each push"""
+    result = [(crates, hero)]
+    for cell, direction in push_list:
+        crates ^= (1 << cell) | (1 << level.neighbours[cell][direction])
+        result.append((crates, cell))
+    return result
+
+
+def segment_cost(level: Level, crates: int, hero: int, push_list: List[Push]) -> int:
+    """returns the number of moves of a list of pushes played with shortest walks"""
+    moves = 0
+    for cell, direction in push_list:
+        moves += walk_distances(level, crates, hero)[level.neighbours[cell][direction ^ 1]] + 1
+        crates ^= (1 << cell) | (1 << level.neighbours[cell][direction])
+        hero = cell
+    return moves
+
+
+def reorder(
+    level: Level, start: Tuple[int, int], goal: Tuple[int, Optional[int]], allowed: int, max_nodes: int
+) -> Optional[Tuple[int, int, List[Push]]]:
+    """
+    uniform-cost search of the cheapest list of pushes from start to goal (crates, hero cell or None for
+    any cell), the crates staying on the allowed cells (a bitmask); returns (moves, pushes, list of pushes),
+    or None if the goal is not found within max_nodes expanded nodes
+    """
+    neighbours = level.neighbours
+    goal_crates, goal_hero = goal
+    costs: Dict[Tuple[int, int], Tuple[int, int]] = {start: (0, 0)}
+    parents: Dict[Tuple[int, int], Tuple[Tuple[int, int], Push]] = {}
+    frontier = [(0, 0, start)]
+    expanded = 0
+    while frontier:
+        moves, count, node = heapq.heappop(frontier)
+        if costs[node] < (moves, count):
+            continue  # outdated entry
+        crates, hero = node
+        if crates == goal_crates and (goal_hero is None or hero == goal_hero):
+            path = []
+            while node != start:
+                node, push = parents[node]
+                path.append(push)
+            return moves, count, path[::-1]
+        expanded += 1
+        if expanded > max_nodes:
+            return None
+        distances = walk_distances(level, crates, hero)
+        remaining = crates
+        while remaining:
+            low = remaining & -remaining
+            remaining ^= low
+            cell = low.bit_length() - 1
+            for direction in range(4):
+                behind, beyond = neighbours[cell][direction ^ 1], neighbours[cell][direction]
+                if behind not in distances or beyond < 0 or crates >> beyond & 1 or not allowed >> beyond & 1:
+                    continue
+                child = (crates ^ low ^ (1 << beyond), cell)
+                cost = (moves + distances[behind] + 1, count + 1)
+                if child not in costs or cost < costs[child]:
+                    costs[child] = cost
+                    parents[child] = (node, (cell, direction))
+                    heapq.heappush(frontier, (*cost, child))
+    return None
+
+
+def optimize_pushes(
+    level: Level, crates: int, hero: int, push_list: List[Push], window: int = 8, max_nodes: int = 5000,
+    solved: bool = True,
+) -> List[Push]:
+    """
+    improves a list of pushes window by window (see reorder); when solved, the hero may end
+    anywhere after the last push, otherwise on the cell it reaches with push_list
+    """
+    push_list = list(push_list)
+    start = 0
+    while start < len(push_list):
+        end = min(start + window, len(push_list))
+        states = positions(level, crates, hero, push_list)
+        allowed = 0
+        for state_crates, _ in states[start:end + 1]:
+            allowed |= state_crates
+        goal_crates, goal_hero = states[end]
+        if solved and end == len(push_list):
+            goal_hero = None
+        found = reorder(level, states[start], (goal_crates, goal_hero), allowed, max_nodes)
+        if found is not None:
+            moves, count, better = found
+            old_moves = segment_cost(level, *states[start], push_list[start:end])
+            if (moves, count) < (old_moves, end - start) and count <= end - start:
+                push_list[start:end] = better
+        start += 1
+    return push_list
+
+
+def optimize(board: str, solution: str, notation: str = 'auto', window: int = 8, max_nodes: int = 5000) -> Optimization:
+    """
+    shortens a solution (see verify.decode) of a board in the project alphabet, returns the optimized
+    solution, in the notation of the input, and the metrics before and after
+    """
+    if notation == 'auto':
+        notation = detect_notation(solution)
+    level, crates, hero = load(board)
+    actions = decode(solution, notation)
+    before = replay(level, crates, hero, actions)
+    if before.error is not None:
+        raise UndoableActionException(
+            f"action {actions[before.error]} at index {before.error} impossible\n"
+            +
+            ErrorHelpStrings.UNDOABLE_ACTION_HELP
+        )
+    indices = [action_letters.index(letter) for letter in actions]
+    push_list = optimize_pushes(
+        level, crates, hero, extract_pushes(level, hero, indices), window, max_nodes, before.solved
+    )
+    indices = expand(level, crates, hero, push_list)
+    if not before.solved:
+        # same final position as the input: walk to the cell the hero ends on
+        last_crates, last_hero = positions(level, crates, hero, push_list)[-1]
+        final_hero = hero
+        for n in (action_letters.index(letter) for letter in actions):
+            final_hero = level.neighbours[final_hero][n & 3]
+        indices += walk(level, last_crates, last_hero, final_hero)
+    optimized = "".join(action_letters[n] for n in indices)
+    after = replay(level, crates, hero, optimized)
+    if after.moves > before.moves or after.pushes > before.pushes or after.solved != before.solved:
+        optimized, after = actions, before
+    return Optimization(convert(optimized, notation, 'hdgb'), before, after)
+
+
+def optimize_batch(
+    pairs: Iterable[Tuple[Optional[str], str, Optional[str]]], notation: str = 'auto', window: int = 8,
+    max_nodes: int = 5000,
+) -> Iterator[Dict]:
+    """optimizes (title, board, solution) pairs, yields a result dict per pair"""
+    for index, (title, board, solution) in enumerate(pairs):
+        result: Dict = {'index': index}
+        if title is not None:
+            result['title'] = title
+        try:
+            if solution is None:
+                raise ValueError("no solution")
+            optimization = optimize(board, solution, notation, window, max_nodes)
+        except Exception as error:  # a broken pair must not stop the batch
+            result.update(status='error', error=f"{type(error).__name__}: {error}")
+            yield result
+            continue
+        result.update(
+            status='optimized',
+            solution=optimization.solution,
+            before={'moves': optimization.before.moves, 'pushes': optimization.before.pushes},
+            after={'moves': optimization.after.moves, 'pushes': optimization.after.pushes},
+        )
+        yield result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Shorten Sokoban solutions, one JSON line per level")
+    parser.add_argument('pairs', help="XSB/.sok pack with solutions, or JSON lines file ('-' for stdin)")
+    parser.add_argument('--notation', default='auto', choices=('auto', 'hdgb', 'lurd'))
+    parser.add_argument('--window', type=int, default=8, help="pushes rearranged together")
+    parser.add_argument('--max-nodes', type=int, default=5000, help="nodes searched per window")
+    args = parser.parse_args(argv)
+
+    notation = args.notation
+    if notation == 'auto' and args.pairs.endswith(('.sok', '.xsb')):
+        notation = 'lurd'
+    for result in optimize_batch(read_pairs(args.pairs), notation, args.window, args.max_nodes):
+        print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+    main()
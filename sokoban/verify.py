@@ -0,0 +1,196 @@
+""" Bulk verification of solutions, and conversion between move notations
+
+A solution is replayed on the (crates bitmask, hero cell) pair of the level
+(see functional.bitboard), without building a State per move, and the replay
+stops at the first illegal action. Solutions may be written in the project
+notation (hdgbHDGB, see Sokoban.execute) or in the standard lurdLURD one, in
+both cases lowercase for a move and uppercase for a push; they may be
+run-length encoded ("3r" for "rrr") and split over several lines.
+
+usage: python -m sokoban.verify check pairs.sok
+       python -m sokoban.verify check pairs.jsonl ('-' for stdin)
+       python -m sokoban.verify convert SOLUTION [--to lurd]
+The check mode streams level/solution pairs and prints a JSON line per pair.
+From an XSB/.sok pack, the solution of a level is read from its notes (a
+"Solution" line, followed by the lines of the solution), in the lurd notation
+unless --notation says otherwise. Other files hold JSON lines:
+{"level": board (XSB or project alphabet), "solution": ..., "title": ...}.
+"""
+import argparse
+import functools
+import json
+import sys
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, TextIO, Tuple
+
+from .Level import Level
+from .exceptions import NotRecognizedActionException, ErrorHelpStrings
+from .functional import bitboard
+from .functional.sokoban import action_letters, load_from_string
+from .xsb import Puzzle, from_xsb, read_levels
+
+NOTATIONS = ('hdgb', 'lurd')
+# letters of the actions in the standard notation, in the order of action_letters
+LURD_LETTERS = "lrudLRUD"
+LETTERS = {'hdgb': action_letters, 'lurd': LURD_LETTERS}
+
+Replay = NamedTuple(
+    "Replay",
+    [
+        ("solved", bool),  # every crate is on a goal after the last action
+        ("moves", int),  # legal actions played
+        ("pushes", int),  # legal pushes played
+        ("error", Optional[int]),  # index of the first illegal action, None if all of them are legal
+    ],
+)
+
+
+def detect_notation(solution: str) -> str:
+    """
+    returns the notation of a solution: 'lurd' if it uses l, r or u, 'hdgb' otherwise
+    (a solution made only of d and D is read in the project notation)
+    """
+    return 'lurd' if any(letter in "lruLRU" for letter in solution) else 'hdgb'
+
+
+def decode(solution: str, notation: str = 'auto') -> str:
+    """
+    returns a solution in the project notation, run-length encoding and whitespace removed.
+    notation is 'hdgb', 'lurd' or 'auto' (see detect_notation)
+    """
+    if notation == 'auto':
+        notation = detect_notation(solution)
+    letters = LETTERS[notation]
+    result, count = [], ''
+    for letter in solution:
+        if letter.isdigit():
+            count += letter
+        elif letter in letters:
+            result.append(action_letters[letters.index(letter)] * int(count or 1))
+            count = ''
+        elif not letter.isspace():
+            raise NotRecognizedActionException(
+                f"Action inconnue: {letter}\n"
+                +
+                ErrorHelpStrings.NOT_RECOGNIZED_ACTION_HELP
+            )
+    return ''.join(result)
+
+
+def convert(solution: str, to: str = 'lurd', notation: str = 'auto') -> str:
+    """converts a solution to the notation to ('hdgb' or 'lurd')"""
+    return decode(solution, notation).translate(str.maketrans(action_letters, LETTERS[to]))
+
+
+def replay(level: Level, crates: int, hero: int, solution: str) -> Replay:
+    """plays a solution in the project notation from the (crates bitmask, hero cell) pair of a level"""
+    pushes = 0
+    for index, letter in enumerate(solution):
+        n = action_letters.index(letter)
+        result = bitboard.step(level, crates, hero, n)
+        if result is None:
+            return Replay(False, index, pushes, index)
+        crates, hero = result
+        pushes += n >= 4
+    return Replay(crates & ~level.goal_mask == 0, len(solution), pushes, None)
+
+
+@functools.lru_cache(maxsize=256)
+def load(board: str) -> Tuple[Level, int, int]:
+    """returns the (level, crates bitmask, hero cell) of a board in the project alphabet, kept for the next pairs"""
+    bit = bitboard.from_state(load_from_string(board))
+    return bit.level, bit.crates, bit.hero
+
+
+def verify(board: str, solution: str, notation: str = 'auto') -> Replay:
+    """replays a solution (see decode) on a board in the project alphabet"""
+    return replay(*load(board), decode(solution, notation))
+
+
+def puzzle_solution(puzzle: Puzzle) -> Optional[str]:
+    """returns the solution written in the notes of a puzzle ("Solution: ..." and the lines after it), or None"""
+    solution = None
+    for note in puzzle.notes:
+        if solution is None:
+            if note.lower().startswith('solution'):
+                solution = note.split(':', 1)[1] if ':' in note else ''
+        elif ':' in note:
+            break
+        else:
+            solution += note
+    return solution
+
+
+def read_pairs(source: str) -> Iterator[Tuple[Optional[str], str, Optional[str]]]:
+    """yields the (title, board in the project alphabet, solution) pairs of a file, one at a time"""
+    if source.endswith(('.sok', '.xsb')):
+        for puzzle in read_levels(source):
+            yield puzzle.title, puzzle.board, puzzle_solution(puzzle)
+        return
+    file: TextIO = sys.stdin if source == '-' else open(source)
+    try:
+        for line in file:
+            if not line.strip():
+                continue
+            pair = json.loads(line)
+            board = pair['level']
+            if '#' in board:
+                board = from_xsb(row for row in board.split('\n') if row.strip())
+            yield pair.get('title'), board, pair.get('solution')
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+def verify_batch(pairs: Iterable[Tuple[Optional[str], str, Optional[str]]], notation: str = 'auto') -> Iterator[Dict]:
+    """
+    verifies (title, board, solution) pairs, yields a result dict per pair: status is 'solved',
+    'unsolved' (legal but the crates are not all on goals), 'illegal' (error_index gives the first
+    illegal action of the decoded solution) or 'error' (unreadable level or solution)
+    """
+    for index, (title, board, solution) in enumerate(pairs):
+        result: Dict = {'index': index}
+        if title is not None:
+            result['title'] = title
+        try:
+            if solution is None:
+                raise ValueError("no solution")
+            outcome = verify(board, solution, notation)
+        except Exception as error:  # a broken pair must not stop the batch
+            result.update(status='error', error=f"{type(error).__name__}: {error}")
+            yield result
+            continue
+        if outcome.error is not None:
+            result.update(status='illegal', error_index=outcome.error)
+        else:
+            result['status'] = 'solved' if outcome.solved else 'unsolved'
+        result.update(moves=outcome.moves, pushes=outcome.pushes)
+        yield result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Verify Sokoban solutions, convert between hdgb and lurd")
+    commands = parser.add_subparsers(dest='command', required=True)
+    check = commands.add_parser('check', help="verify level/solution pairs, one JSON line per pair")
+    check.add_argument('pairs', help="XSB/.sok pack with solutions, or JSON lines file ('-' for stdin)")
+    check.add_argument('--notation', default='auto', choices=('auto',) + NOTATIONS)
+    conversion = commands.add_parser('convert', help="convert a solution to another notation")
+    conversion.add_argument('solution')
+    conversion.add_argument('--to', default='lurd', choices=NOTATIONS)
+    conversion.add_argument('--notation', default='auto', choices=('auto',) + NOTATIONS)
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        print(convert(args.solution, args.to, args.notation))
+        return
+    notation = args.notation
+    if notation == 'auto' and args.pairs.endswith(('.sok', '.xsb')):
+        notation = 'lurd'  # the notation of the packs, "D" alone would be read as a push to the right
+    failures = 0
+    for result in verify_batch(read_pairs(args.pairs), notation):
+        failures += result['status'] != 'solved'
+        print(json.dumps(result), flush=True)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+""" Reading and writing of XSB / .sok level packs
+
+Boards use the standard alphabet (# wall, @ hero, + hero on goal, $ crate,
+* crate on goal, . goal, space, - or _ floor, and p P b B for hero and crate),
+with optional run-length encoding ("4#" for "####", "|" between rows).
+Levels are read lazily, one at a time, and converted to the project alphabet
+so that they can be given to State or load_from_string.
+
+A level is made of the lines right above its board (the first one is its
+title, "; 1" or "Level 1"), its board, and the lines which directly follow
+the board up to the next blank line ("Title: ...", "Author: ...", comments).
+Lines separated from any board by blank lines (pack headers) are skipped.
+"""
+import os
+from typing import Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple, Union
+
+# XSB character -> project character
+XSB_TO_PROJECT = {
+    '#': '%', '@': 'p', '+': 'q', '$': 'c', '*': 'v', '.': 'b',
+    ' ': ' ', '-': ' ', '_': ' ',
+    'p': 'p', 'P': 'q', 'b': 'c', 'B': 'v',
+}
+PROJECT_TO_XSB = {'%': '#', 'p': '@', 'q': '+', 'c': '$', 'v': '*', 'b': '.', ' ': ' '}
+RLE_CHARACTERS = set('0123456789|')
+
+Puzzle = NamedTuple(
+    "Puzzle",
+    [
+        ("title", Optional[str]),
+        ("notes", Tuple[str, ...]),
+        ("board", str),
+    ],
+)
+Source = Union[str, os.PathLike, TextIO]
+
+
+def decode_rle(line: str) -> List[str]:
+    """expands a run-length encoded board line, returns its rows"""
+    rows, row, count = [], '', ''
+    for char in line:
+        if char.isdigit():
+            count += char
+        elif char == '|':
+            rows.append(row)
+            row = ''
+        else:
+            row += char * int(count or 1)
+            count = ''
+    rows.append(row)
+    return rows
+
+
+def is_board_line(line: str) -> bool:
+    """returns True if the line is a row (or several run-length encoded rows) of a board"""
+    if '#' not in line:
+        return False
+    return all(char in XSB_TO_PROJECT or char in RLE_CHARACTERS for char in line)
+
+
+def from_xsb(rows: Iterable[str]) -> str:
+    """converts XSB rows in a board string of the project alphabet, padding ragged rows"""
+    rows = [row.rstrip() for row in rows]
+    width = max(len(row) for row in rows)
+    return ''.join(''.join(XSB_TO_PROJECT[char] for char in row).ljust(width) + '\n' for row in rows)
+
+
+def to_xsb(board: str) -> str:
+    """converts a board string of the project alphabet in XSB rows, without trailing spaces"""
+    return ''.join(
+        ''.join(PROJECT_TO_XSB[char] for char in line).rstrip() + '\n'
+        for line in board.split('\n') if line != ''
+    )
+
+
+def strip_comment(line: str) -> str:
+    """text of a comment line, without its ';'"""
+    return line.lstrip(';').strip()
+
+
+def make_puzzle(leading: List[str], rows: List[str], trailing: List[str]) -> Puzzle:
+    """builds a Puzzle from the lines around its board"""
+    notes = leading + trailing
+    titles = [note for note in notes if note.lower().startswith('title:')]
+    if titles:
+        title = titles[0].split(':', 1)[1].strip()
+        notes.remove(titles[0])
+    elif leading:
+        title = strip_comment(notes.pop(0))
+    else:
+        title = None
+    return Puzzle(title, tuple(notes), from_xsb(rows))
+
+
+def parse_levels(lines: Iterable[str]) -> Iterator[Puzzle]:
+    """yields the levels of an iterable of lines (a file object for instance), one at a time"""
+    leading: List[str] = []
+    rows: List[str] = []
+    trailing: List[str] = []
+    in_board, after_board = False, False
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if is_board_line(line):
+            if after_board:
+                yield make_puzzle(leading, rows, trailing)
+                leading, rows, trailing, after_board = [], [], [], False
+            rows.extend(decode_rle(line))
+            in_board = True
+            continue
+        if in_board:
+            in_board, after_board = False, True
+        if not line.strip():
+            if after_board:
+                yield make_puzzle(leading, rows, trailing)
+                rows, trailing, after_board = [], [], False
+            leading = []  # only the block right above a board belongs to it
+            continue
+        (trailing if after_board else leading).append(line.strip())
+    if in_board or after_board:
+        yield make_puzzle(leading, rows, trailing)
+
+
+def read_levels(source: Source) -> Iterator[Puzzle]:
+    """yields the levels of a pack, given as a path or as a file object, one at a time"""
+    if hasattr(source, 'read'):
+        yield from parse_levels(source)
+        return
+    with open(source, encoding='utf-8', errors='replace') as file:
+        yield from parse_levels(file)
+
+
+def write_levels(puzzles: Iterable[Union[Puzzle, str]], destination: Source) -> int:
+    """
+    writes puzzles (or board strings of the project alphabet) as an XSB pack,
+    to a path or a file object, returns the number of levels written
+    """
+    if not hasattr(destination, 'write'):
+        with open(destination, 'w', encoding='utf-8') as file:
+            return write_levels(puzzles, file)
+    count = 0
+    for puzzle in puzzles:
+        if isinstance(puzzle, str):
+            puzzle = Puzzle(None, (), puzzle)
+        if count:
+            destination.write('\n')
+        if puzzle.title is not None:
+            destination.write(f'; {puzzle.title}\n')
+        destination.write(to_xsb(puzzle.board))
+        for note in puzzle.notes:
+            destination.write(note + '\n')
+        count += 1
+    return count
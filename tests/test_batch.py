@@ -0,0 +1,60 @@
+""" tests of the batch solver: results, budgets and dead workers """
+import multiprocessing
+import os
+
+import pytest
+
+from sokoban import batch
+from sokoban.benchmark import load_corpus
+from sokoban.exceptions import NotRecognizedAlgorithmException
+from sokoban.verify import verify
+
+from .test_engines import corpus_board
+
+
+def corpus(*titles):
+    return [puzzle for puzzle in load_corpus() if puzzle.title in titles]
+
+
+def test_solved_with_titles():
+    puzzles = corpus("Simple 1", "Simple 2", "Small 1", "Small 2")
+    results = sorted(batch.solve_batch(puzzles, 'astar', workers=2), key=lambda result: result['index'])
+    assert [result['title'] for result in results] == [puzzle.title for puzzle in puzzles]
+    for puzzle, result in zip(puzzles, results):
+        assert result['status'] == 'solved'
+        assert verify(puzzle.board, result['solution'], 'hdgb').solved
+        assert result['pushes'] == sum(letter.isupper() for letter in result['solution'])
+
+
+def test_time_budget():
+    boards = [corpus_board("Original 2"), corpus_board("Simple 1")]
+    results = sorted(batch.solve_batch(boards, 'astar', workers=1, time_limit=0.5), key=lambda result: result['index'])
+    assert [result['status'] for result in results] == ['timeout', 'solved']
+    assert results[0]['time'] < 5
+
+
+def test_unknown_algorithm():
+    with pytest.raises(NotRecognizedAlgorithmException):
+        next(batch.solve_batch([corpus_board("Simple 1")], 'hda*'))
+
+
+def crash(state, stats=None, cache=None):
+    """kills the worker on the levels with 3 goals, solves the others"""
+    if len(state.level.goal_cells) == 3:
+        os._exit(1)
+    return batch.ALGORITHMS['astar'](state, stats=stats, cache=cache)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason="the workers must inherit the crashing solver")
+def test_dead_worker(monkeypatch):
+    monkeypatch.setitem(batch.ALGORITHMS, 'crash', crash)
+    puzzles = load_corpus()[:8]
+    results = {result['index']: result for result in batch.solve_batch(puzzles, 'crash', workers=2)}
+    assert sorted(results) == list(range(len(puzzles)))
+    for index, puzzle in enumerate(puzzles):
+        goals = puzzle.board.count('b') + puzzle.board.count('v') + puzzle.board.count('q')
+        if goals == 3:
+            assert results[index]['status'] == 'error'
+        else:
+            assert results[index]['status'] == 'solved'
+    assert any(result['status'] == 'error' for result in results.values())
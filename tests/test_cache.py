@@ -0,0 +1,77 @@
+""" tests of the sqlite solution cache """
+from sokoban import functional as f
+from sokoban.functional import bitboard, load_from_string
+from sokoban.functional.cache import SolutionCache
+from sokoban.functional.sokoban import action_letters
+from sokoban.verify import replay
+
+from .test_engines import MIRRORED, SYMMETRIC, corpus_board
+
+
+def moves_solution(board: str):
+    bit = bitboard.from_state(load_from_string(board))
+    return bit, bitboard.bfs_moves(bit.level, bit.crates, bit.hero)
+
+
+def test_put_get(tmp_path):
+    path = str(tmp_path / "solutions.sqlite")
+    bit, indices = moves_solution(corpus_board("Small 2"))
+    stats = f.SolverStats()
+    stats.expanded = 42
+    cache = SolutionCache(path)
+    assert cache.get(bit.level, bit.crates, bit.hero, 'bfs', True) is None
+    cache.put(bit.level, bit.crates, bit.hero, 'bfs', True, indices, stats)
+    cache.close()
+    # kept on disk, for another process
+    cache = SolutionCache(path)
+    found = f.SolverStats()
+    assert cache.get(bit.level, bit.crates, bit.hero, 'bfs', True, found) == indices
+    assert found.expanded == 42 and 'cache' in found.phases
+    # one entry per algorithm
+    assert cache.get(bit.level, bit.crates, bit.hero, 'iddfs', True) is None
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_least_recently_used_evicted():
+    cache = SolutionCache(":memory:", max_entries=2)
+    solved = [moves_solution(corpus_board(title)) for title in ("Simple 1", "Simple 2", "Small 1")]
+    first, second, third = solved
+    for bit, indices in (first, second):
+        cache.put(bit.level, bit.crates, bit.hero, 'bfs', True, indices)
+    assert cache.get(first[0].level, first[0].crates, first[0].hero, 'bfs', True) is not None
+    bit, indices = third
+    cache.put(bit.level, bit.crates, bit.hero, 'bfs', True, indices)
+    assert len(cache) == 2
+    assert [cache.get(bit.level, bit.crates, bit.hero, 'bfs', True) is not None for bit, _ in solved] == [
+        True, False, True
+    ]
+
+
+def test_push_solutions_shared_by_the_hero_region():
+    # the hero starts elsewhere in the same region: the push solution is walked from its cell
+    cache = SolutionCache(":memory:")
+    state = load_from_string(corpus_board("Small 2"))
+    solution = f.solving_algorithms['astar'](state, cache=cache)
+    moved = corpus_board("Small 2").replace("%p ", "% p")
+    assert moved != corpus_board("Small 2")
+    bit = bitboard.from_state(load_from_string(moved))
+    found = cache.get(bit.level, bit.crates, bit.hero, 'astar', False)
+    assert found is not None and len(cache) == 1
+    outcome = replay(bit.level, bit.crates, bit.hero, "".join(action_letters[n] for n in found))
+    assert outcome.error is None and outcome.solved
+    assert outcome.pushes == sum(letter.isupper() for letter in f.actions_to_string(solution))
+
+
+def test_cached_solver_mirrored_level():
+    cache = SolutionCache(":memory:")
+    stats = f.SolverStats()
+    solution = f.solving_algorithms['pushes'](load_from_string(SYMMETRIC), cache=cache, stats=stats)
+    assert 'cache' not in stats.phases
+    stats = f.SolverStats()
+    mirrored = f.solving_algorithms['pushes'](load_from_string(MIRRORED), cache=cache, stats=stats)
+    assert 'cache' in stats.phases and len(cache) == 1
+    assert len(mirrored) == len(solution)
+    bit = bitboard.from_state(load_from_string(MIRRORED))
+    outcome = replay(bit.level, bit.crates, bit.hero, f.actions_to_string(mirrored))
+    assert outcome.error is None and outcome.solved
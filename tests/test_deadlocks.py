@@ -0,0 +1,86 @@
+""" tests of the dynamic deadlock detection """
+from sokoban.functional import load_from_string
+from sokoban.functional.deadlocks import block_deadlock, freeze_deadlock, is_deadlock, mask_predicate
+
+
+def detect(board: str, position):
+    """runs the detectors on the crate at position (x, y) of a board in the project alphabet"""
+    state = load_from_string(board)
+    level = state.level
+    crate = mask_predicate(level.mask(state.crates))
+    cell = level.index[position]
+    return block_deadlock(level, crate, cell), freeze_deadlock(level, crate, cell), is_deadlock(level, crate, cell)
+
+
+def test_2x2_block_off_goal():
+    board = (
+        "%%%%%%%\n"
+        "%     %\n"
+        "% cc  %\n"
+        "% cc p%\n"
+        "% bbbb%\n"
+        "%%%%%%%\n"
+    )
+    block, _, deadlock = detect(board, (2, 2))
+    assert block and deadlock
+
+
+def test_2x2_block_on_goals():
+    board = (
+        "%%%%%%%\n"
+        "%     %\n"
+        "% vv  %\n"
+        "% vv p%\n"
+        "%     %\n"
+        "%%%%%%%\n"
+    )
+    assert detect(board, (2, 2)) == (False, False, False)
+
+
+def test_2x2_block_against_a_wall():
+    board = (
+        "%%%%%%%\n"
+        "%  cc %\n"
+        "%     %\n"
+        "% bb p%\n"
+        "%%%%%%%\n"
+    )
+    block, _, deadlock = detect(board, (3, 1))
+    assert block and deadlock
+
+
+def test_frozen_crates_without_block():
+    # the crates lock each other: a wall above the left one, a wall below the right one
+    board = (
+        "%%%%%%%%\n"
+        "%%%%   %\n"
+        "%  cc  %\n"
+        "%   %  %\n"
+        "% bb p %\n"
+        "%%%%%%%%\n"
+    )
+    for position in (3, 2), (4, 2):
+        block, frozen, deadlock = detect(board, position)
+        assert not block and frozen and deadlock
+
+
+def test_frozen_crate_on_goal_is_not_a_deadlock():
+    board = (
+        "%%%%%%%\n"
+        "%v    %\n"
+        "%     %\n"
+        "%    p%\n"
+        "%%%%%%%\n"
+    )
+    assert detect(board, (1, 1)) == (False, False, False)
+
+
+def test_free_crate():
+    board = (
+        "%%%%%%%\n"
+        "%     %\n"
+        "%  c  %\n"
+        "%  b p%\n"
+        "%%%%%%%\n"
+    )
+    assert detect(board, (3, 2)) == (False, False, False)
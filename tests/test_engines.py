@@ -0,0 +1,166 @@
+""" regression tests of the push-level engines, of the symmetry reduction and of the solution cache """
+import os
+
+import pytest
+
+from sokoban.Solver import Solver
+from sokoban.benchmark import load_corpus
+from sokoban.functional import bitboard, load_from_string, SolverStats
+from sokoban.functional.anytime import anytime_pushes
+from sokoban.functional.astar import astar_pushes
+from sokoban.functional.bidirectional import bidirectional_pushes
+from sokoban.functional.cache import SolutionCache
+from sokoban.functional.iterative import ida_star_pushes
+from sokoban.functional.parallel import hda_speedup, hda_star_pushes
+from sokoban.functional.pushes import bfs_pushes, expand
+from sokoban.functional.sokoban import action_letters
+from sokoban.functional.visited import VisitedStore
+from sokoban.verify import replay
+
+# 8 symmetries: the goals and the walls are invariant by every rotation and reflection
+SYMMETRIC = """%%%%%%%
+%     %
+% cbc %
+% bpv %
+% cb  %
+%     %
+%%%%%%%
+"""
+# image of SYMMETRIC by the horizontal reflection
+MIRRORED = """%%%%%%%
+%     %
+% cbc %
+% vpb %
+%  bc %
+%     %
+%%%%%%%
+"""
+
+# search(level, crates, hero, stats) -> list of pushes or None, and whether the solutions are push-optimal
+ENGINES = {
+    'pushes': (lambda level, crates, hero, stats: bfs_pushes(level, crates, hero, stats=stats), True),
+    'astar': (lambda level, crates, hero, stats: astar_pushes(level, crates, hero, stats=stats), True),
+    'idastar': (lambda level, crates, hero, stats: ida_star_pushes(level, crates, hero, stats=stats), True),
+    'anytime': (lambda level, crates, hero, stats: anytime_pushes(level, crates, hero, stats=stats), True),
+    'bidirectional': (lambda level, crates, hero, stats: bidirectional_pushes(level, crates, hero, stats), False),
+}
+
+
+def corpus_board(title: str) -> str:
+    return next(puzzle.board for puzzle in load_corpus() if puzzle.title == title)
+
+
+def check_solution(board: str, push_list) -> int:
+    """replays the pushes with their walks on the board, returns the number of pushes"""
+    bit = bitboard.from_state(load_from_string(board))
+    solution = "".join(action_letters[n] for n in expand(bit.level, bit.crates, bit.hero, push_list))
+    outcome = replay(bit.level, bit.crates, bit.hero, solution)
+    assert outcome.error is None and outcome.solved
+    return outcome.pushes
+
+
+def reference_pushes(board: str) -> int:
+    """number of pushes of an optimal solution, found without symmetry reduction"""
+    bit = bitboard.from_state(load_from_string(board))
+    return len(bfs_pushes(bit.level, bit.crates, bit.hero, symmetry=False))
+
+
+def test_find_symmetries():
+    level = load_from_string(SYMMETRIC).level
+    assert len(level.symmetries) == 8
+    identity = level.symmetries[0]
+    assert list(identity.cells) == list(range(len(level.cells)))
+    for symmetry in level.symmetries:
+        assert sorted(symmetry.cells) == list(range(len(level.cells)))
+        assert {symmetry.cells[cell] for cell in level.goal_cells} == set(level.goal_cells)
+    assert len(load_from_string(corpus_board("Small 6")).level.symmetries) == 1
+
+
+@pytest.mark.parametrize("name", ENGINES)
+def test_symmetric_level(name):
+    search, optimal = ENGINES[name]
+    bit = bitboard.from_state(load_from_string(SYMMETRIC))
+    push_list = search(bit.level, bit.crates, bit.hero, SolverStats())
+    assert push_list is not None
+    pushes = check_solution(SYMMETRIC, push_list)
+    if optimal:
+        assert pushes == reference_pushes(SYMMETRIC)
+
+
+@pytest.mark.parametrize("search", [bfs_pushes, astar_pushes])
+def test_symmetry_reduction(search):
+    bit = bitboard.from_state(load_from_string(SYMMETRIC))
+    reduced, plain = SolverStats(), SolverStats()
+    with_symmetry = search(bit.level, bit.crates, bit.hero, stats=reduced, symmetry=True)
+    without = search(bit.level, bit.crates, bit.hero, stats=plain, symmetry=False)
+    assert check_solution(SYMMETRIC, with_symmetry) == check_solution(SYMMETRIC, without)
+    # the images of a node by the symmetries are stored once
+    assert reduced.expanded <= plain.expanded
+    assert reduced.generated - reduced.duplicates < plain.generated - plain.duplicates
+
+
+@pytest.mark.parametrize("name", ENGINES)
+def test_deadlock_pruned_level(name):
+    search, optimal = ENGINES[name]
+    board = corpus_board("Small 6")
+    bit = bitboard.from_state(load_from_string(board))
+    stats = SolverStats()
+    push_list = search(bit.level, bit.crates, bit.hero, stats)
+    assert stats.pruned > 0
+    pushes = check_solution(board, push_list)
+    if optimal:
+        assert pushes == reference_pushes(board)
+
+
+def test_visited_spills_to_disk(monkeypatch):
+    spills = []
+    spill = VisitedStore.spill
+    monkeypatch.setattr(VisitedStore, "spill", lambda store: spills.append(len(store.hot)) or spill(store))
+    board = corpus_board("Small 6")
+    bit = bitboard.from_state(load_from_string(board))
+    push_list = bfs_pushes(bit.level, bit.crates, bit.hero, budget=8)
+    assert spills
+    assert check_solution(board, push_list) == reference_pushes(board)
+    del spills[:]
+    moves = bitboard.bfs_moves(bit.level, bit.crates, bit.hero, budget=8)
+    assert spills
+    assert len(moves) == len(bitboard.bfs_moves(bit.level, bit.crates, bit.hero))
+
+
+@pytest.mark.parametrize("algorithm, moves", [('pushes', False), ('bfs', True)])
+def test_cache_symmetric_lookup(algorithm, moves):
+    cache = SolutionCache(":memory:")
+    bit = bitboard.from_state(load_from_string(SYMMETRIC))
+    if moves:
+        indices = bitboard.bfs_moves(bit.level, bit.crates, bit.hero)
+    else:
+        indices = expand(bit.level, bit.crates, bit.hero, bfs_pushes(bit.level, bit.crates, bit.hero))
+    cache.put(bit.level, bit.crates, bit.hero, algorithm, moves, indices)
+    mirrored = bitboard.from_state(load_from_string(MIRRORED))
+    found = cache.get(mirrored.level, mirrored.crates, mirrored.hero, algorithm, moves)
+    assert found is not None and len(cache) == 1
+    outcome = replay(mirrored.level, mirrored.crates, mirrored.hero, "".join(action_letters[n] for n in found))
+    assert outcome.error is None and outcome.solved
+    assert outcome.moves == len(indices)
+
+
+def test_select_cheapest_first():
+    assert Solver.select(optimal="pushes", parallel=False) == ['astar', 'idastar', 'pushes']
+    costs = [Solver.algorithms[name].cost for name in Solver.select()]
+    assert costs == sorted(costs)
+
+
+@pytest.mark.parametrize("title", ["Small 6", "Main"])
+def test_hda_star(title):
+    board = corpus_board(title)
+    bit = bitboard.from_state(load_from_string(board))
+    stats = SolverStats()
+    push_list = hda_star_pushes(bit.level, bit.crates, bit.hero, workers=3, stats=stats)
+    assert check_solution(board, push_list) == reference_pushes(board)
+    assert stats.expanded > 0
+
+
+def test_hda_speedup_single_cpu(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    timing = hda_speedup(load_from_string(corpus_board("Small 1")), workers=2)
+    assert timing["workers"] == 2 and timing["cpus"] == 1 and timing["speedup"] is None
@@ -0,0 +1,36 @@
+""" tests of the NumPy layer of the level tables """
+import importlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from sokoban import grid
+from sokoban.functional import load_from_string
+
+from .test_engines import SYMMETRIC, corpus_board
+
+# the module, sokoban.Level is the class
+level_module = importlib.import_module("sokoban.Level")
+
+
+def tables(board: str, monkeypatch, threshold: int):
+    """the tables of a level built with NumPy from threshold (see Level.GRID_THRESHOLD), and some flood fills"""
+    monkeypatch.setattr(level_module, "GRID_THRESHOLD", threshold)
+    level = load_from_string(board).level
+    level = level_module.Level(level.walls, level.goals, level.map_size)
+    floods = [level.flood([cell]) for cell in range(0, len(level.cells), 7)]
+    return (level.neighbours, level.squares, level.goal_distances, level.dead_mask, level.symmetries, floods)
+
+
+@pytest.mark.parametrize("board", [SYMMETRIC, corpus_board("Small 6"), corpus_board("Original 1")])
+def test_same_tables_as_python(board, monkeypatch):
+    assert tables(board, monkeypatch, 0) == tables(board, monkeypatch, 1 << 62)
+
+
+def test_wall_mask():
+    level = load_from_string(corpus_board("Small 1")).level
+    walls = grid.wall_mask(level)
+    w, h = level.map_size
+    assert walls.shape == (h, w)
+    assert [(x, y) for y, x in zip(*np.nonzero(~walls))] == list(level.cells)
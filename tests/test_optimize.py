@@ -0,0 +1,84 @@
+""" tests of the post-optimization of solutions """
+import pytest
+
+from sokoban.exceptions import UndoableActionException
+from sokoban.functional import bitboard
+from sokoban.functional.astar import astar_pushes
+from sokoban.functional.pushes import expand
+from sokoban.functional.sokoban import action_letters
+from sokoban.optimize import optimize
+from sokoban.verify import convert, load, verify
+
+from .test_engines import corpus_board
+
+TITLES = ["Simple 1", "Simple 2", "Small 1", "Small 2", "Small 3", "Small 4", "Small 5"]
+
+
+def solution(board: str) -> str:
+    """a push-optimal solution played with shortest walks"""
+    level, crates, hero = load(board)
+    return "".join(action_letters[n] for n in expand(level, crates, hero, astar_pushes(level, crates, hero)))
+
+
+def with_detour(board: str, actions: str) -> str:
+    """inserts a step and its way back at the first position where the hero can step without pushing"""
+    level, crates, hero = load(board)
+    for index, letter in enumerate(actions):
+        for n in range(4):
+            if bitboard.step(level, crates, hero, n) is not None:
+                return actions[:index] + action_letters[n] + action_letters[n ^ 1] + actions[index:]
+        crates, hero = bitboard.step(level, crates, hero, action_letters.index(letter))
+    raise AssertionError("the hero cannot move")
+
+
+def play(level, crates, hero, actions: str):
+    """returns the (crates, hero) pair after the actions"""
+    for letter in actions:
+        crates, hero = bitboard.step(level, crates, hero, action_letters.index(letter))
+    return crates, hero
+
+
+@pytest.mark.parametrize("title", TITLES)
+def test_never_longer(title):
+    board = corpus_board(title)
+    actions = solution(board)
+    result = optimize(board, actions)
+    assert result.after.solved
+    assert result.after.moves <= result.before.moves and result.after.pushes <= result.before.pushes
+    assert verify(board, result.solution).solved
+
+
+@pytest.mark.parametrize("title", TITLES)
+def test_detour_removed(title):
+    board = corpus_board(title)
+    actions = with_detour(board, solution(board))
+    result = optimize(board, actions, 'hdgb')
+    assert result.before.moves == len(actions)
+    assert result.after.moves <= len(actions) - 2
+    assert verify(board, result.solution, 'hdgb').solved
+
+
+def test_notation_kept():
+    board = corpus_board("Small 2")
+    actions = convert(with_detour(board, solution(board)), 'lurd', 'hdgb')
+    result = optimize(board, actions, 'lurd')
+    assert set(result.solution) <= set("lurdLURD")
+    assert verify(board, result.solution, 'lurd').solved
+
+
+def test_unsolved_prefix():
+    board = corpus_board("Small 5")
+    actions = with_detour(board, solution(board))
+    prefix = actions[:len(actions) // 2]
+    result = optimize(board, prefix, 'hdgb')
+    assert not result.after.solved
+    assert result.after.moves <= result.before.moves and result.after.pushes <= result.before.pushes
+    # same final position as the input
+    level, crates, hero = load(board)
+    assert play(level, crates, hero, result.solution) == play(level, crates, hero, prefix)
+
+
+def test_illegal_solution():
+    board = corpus_board("Simple 1")
+    with pytest.raises(UndoableActionException):
+        optimize(board, "gB")
@@ -0,0 +1,65 @@
+""" tests of the solution checker and of the notation conversion """
+import json
+
+import pytest
+
+from sokoban.exceptions import NotRecognizedActionException
+from sokoban.verify import convert, decode, detect_notation, main, read_pairs, verify, verify_batch
+
+# hero above the crate, goal below it
+BOARD = """%%%%
+%p %
+%c %
+%b %
+%%%%
+"""
+
+
+def test_notations():
+    assert detect_notation("rD") == 'lurd'
+    assert detect_notation("dB") == 'hdgb'
+    assert decode("3r 2D") == "dddBB"
+    assert convert("dddBB") == "rrrDD"
+    assert convert(convert("gHdB", 'lurd'), 'hdgb') == "gHdB"
+    with pytest.raises(NotRecognizedActionException):
+        decode("rxD")
+
+
+def test_verify():
+    outcome = verify(BOARD, "D", 'lurd')
+    assert outcome.solved and outcome.moves == 1 and outcome.pushes == 1 and outcome.error is None
+    assert verify(BOARD, "B").solved
+    outcome = verify(BOARD, "", 'lurd')
+    assert not outcome.solved and outcome.error is None
+
+
+def test_illegal_lurd_string():
+    # the hero steps right, then pushes down a crate which is not there
+    outcome = verify(BOARD, "rD", 'lurd')
+    assert not outcome.solved and outcome.error == 1 and outcome.moves == 1
+    # the wall is in the way
+    assert verify(BOARD, "lD", 'lurd').error == 0
+
+
+def test_verify_batch():
+    pairs = [("solved", BOARD, "D"), ("illegal", BOARD, "rD"), (None, BOARD, "r"), ("missing", BOARD, None)]
+    results = list(verify_batch(pairs, 'lurd'))
+    assert [result['status'] for result in results] == ['solved', 'illegal', 'unsolved', 'error']
+    assert results[1]['error_index'] == 1
+    assert 'title' not in results[2] and [result['index'] for result in results] == [0, 1, 2, 3]
+
+
+def test_check_exit_status(tmp_path, capsys):
+    lines = [{'title': "xsb", 'level': "####\n#@ #\n#$ #\n#. #\n####", 'solution': "D"}, {'level': BOARD, 'solution': "D"}]
+    path = tmp_path / "pairs.jsonl"
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n")
+    assert [board for _, board, _ in read_pairs(str(path))] == [BOARD, BOARD]
+    with pytest.raises(SystemExit) as exit:
+        main(['check', str(path), '--notation', 'lurd'])
+    assert exit.value.code == 0
+    path.write_text(path.read_text() + json.dumps({'level': BOARD, 'solution': "rD"}) + "\n")
+    with pytest.raises(SystemExit) as exit:
+        main(['check', str(path), '--notation', 'lurd'])
+    assert exit.value.code == 1
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [result['status'] for result in results[-3:]] == ['solved', 'solved', 'illegal']
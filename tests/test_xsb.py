@@ -0,0 +1,54 @@
+""" tests of the XSB / .sok reader and writer """
+import io
+
+from sokoban.benchmark import load_corpus
+from sokoban.xsb import Puzzle, decode_rle, from_xsb, read_levels, to_xsb, write_levels
+
+
+def test_write_read_round_trip():
+    puzzles = load_corpus()
+    buffer = io.StringIO()
+    assert write_levels(puzzles, buffer) == len(puzzles)
+    buffer.seek(0)
+    assert list(read_levels(buffer)) == puzzles
+
+
+def test_board_strings_are_written_without_title():
+    board = from_xsb(["#####", "#@$.#", "#####"])
+    buffer = io.StringIO()
+    write_levels([board], buffer)
+    assert buffer.getvalue() == "#####\n#@$.#\n#####\n"
+    buffer.seek(0)
+    assert list(read_levels(buffer)) == [Puzzle(None, (), board)]
+
+
+def test_run_length_encoding():
+    assert decode_rle("5#|#@$.#|5#") == ["#####", "#@$.#", "#####"]
+    assert decode_rle("#3-#") == ["#---#"]
+
+
+def test_titles_notes_and_pack_header():
+    pack = io.StringIO(
+        "Pack header, not a level\n"
+        "\n"
+        "; first\n"
+        "#####\n"
+        "#+$ #\n"
+        "#####\n"
+        "Author: someone\n"
+        "\n"
+        "####\n"
+        "#@*#\n"
+        "####\n"
+        "Title: second\n"
+    )
+    first, second = read_levels(pack)
+    assert first.title == "first" and first.notes == ("Author: someone",)
+    assert first.board == "%%%%%\n%qc %\n%%%%%\n"
+    assert second.title == "second" and second.notes == ()
+    assert to_xsb(second.board) == "####\n#@*#\n####\n"
+
+
+def test_ragged_rows_are_padded():
+    board = from_xsb(["  ###", "###@#", "#$. #", "#####"])
+    assert {len(row) for row in board.split("\n") if row} == {5}